@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+## Import-time benchmark for HACC client
+## Cold-starts a fresh interpreter per action with python -X importtime, loads the entrypoint
+##   and the requested action module, then sums the self time of every imported module
+## Optionally compares against a saved baseline and exits non-zero on regression
+##
+## Usage: python3 bench/import_time.py [--runs 5] [--top 5]
+##        python3 bench/import_time.py --save-baseline bench/import_time_baseline.json
+##        python3 bench/import_time.py --baseline bench/import_time_baseline.json [--tolerance 0.25]
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+HACC_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hacc'))
+ACTIONS = ['search', 'add', 'delete', 'rotate', 'install', 'eradicate', 'backup', 'configure', 'upgrade']
+DEFAULT_TOLERANCE = 0.25 ## allowed fractional increase over baseline
+LOADED_SENTINEL = 'HACC_ACTION_LOADED'
+
+## Loads entrypoint (no .py extension) without running main, then imports one action
+## Import guards exit with status 0 when a dependency is missing, so the child only counts
+##   as loaded if it prints the sentinel after load_action returns
+CHILD_CODE = '''
+import sys, importlib.util
+from importlib.machinery import SourceFileLoader
+sys.path.insert(0, {hacc_dir!r})
+loader = SourceFileLoader('hacc_main', {entrypoint!r})
+hacc_main = importlib.util.module_from_spec(importlib.util.spec_from_loader('hacc_main', loader))
+loader.exec_module(hacc_main)
+action_func = hacc_main.load_action({action!r})
+if callable(action_func):
+    print({sentinel!r})
+'''
+
+
+## Parses -X importtime stderr lines of form:
+##   import time:       self [us] |  cumulative | imported package
+## Returns dict of module:self time in microseconds
+def parse_importtime(stderr):
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        modules[module.strip()] = modules.get(module.strip(), 0) + int(self_us)
+    return modules
+
+
+## Returns dict of module:self time for one cold import of action
+def time_action_imports(action):
+    code = CHILD_CODE.format(hacc_dir=HACC_DIR, entrypoint=os.path.join(HACC_DIR, 'hacc'), action=action, sentinel=LOADED_SENTINEL)
+    res = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output = True,
+        text = True
+    )
+    if res.returncode != 0 or LOADED_SENTINEL not in res.stdout.splitlines():
+        print(res.stdout + res.stderr[-2000:])
+        print(f'Importing action {action} failed with code {res.returncode}, action module not loaded')
+        sys.exit(2)
+    return parse_importtime(res.stderr)
+
+
+## Returns dict of action:{'total_ms', 'modules', 'top'} using median of runs
+def bench_actions(actions, runs, top):
+    results = {}
+    for action in actions:
+        samples = [time_action_imports(action) for _ in range(runs)]
+        median_sample = sorted(samples, key=lambda m: sum(m.values()))[len(samples) // 2]
+        slowest = sorted(median_sample.items(), key=lambda m: m[1], reverse=True)[:top]
+
+        results[action] = {
+            'total_ms': round(statistics.median(sum(m.values()) for m in samples) / 1000, 1),
+            'modules': len(median_sample),
+            'top': [[module, round(us / 1000, 1)] for module, us in slowest]
+        }
+    return results
+
+
+## Returns list of (action, baseline ms, current ms) for actions slower than baseline allows
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for action, res in results.items():
+        if action not in baseline:
+            continue
+        allowed_ms = baseline[action]['total_ms'] * (1 + tolerance)
+        if res['total_ms'] > allowed_ms:
+            regressions.append((action, baseline[action]['total_ms'], res['total_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HACC per-action import time benchmark')
+    parser.add_argument('--actions', nargs='+', default=ACTIONS, choices=ACTIONS)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=5, help='slowest modules to list per action')
+    parser.add_argument('--baseline', help='fail if any action is slower than this saved baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--save-baseline', help='write results to file for future comparison')
+    args = parser.parse_args()
+
+    results = bench_actions(args.actions, args.runs, args.top)
+
+    for action, res in results.items():
+        print(f'{action:<10} {res["total_ms"]:>8.1f} ms  {res["modules"]:>4} modules')
+        for module, ms in res['top']:
+            print(f'{"":<12}{ms:>8.1f} ms  {module}')
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(json.dumps(results, indent=4, sort_keys=True))
+        print(f'Saved baseline to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.loads(f.read())
+
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for action, baseline_ms, current_ms in regressions:
+            print(f'Regression: {action} imports took {current_ms:.1f} ms, baseline {baseline_ms:.1f} ms')
+        if regressions:
+            sys.exit(1)
+        print('Import times within baseline')
+
+
+if __name__ == '__main__':
+    main()
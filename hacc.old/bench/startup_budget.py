@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+## Startup latency budget for HACC client
+## Measures wall time from process launch until the client is about to make its first AWS call,
+##   i.e. all CLI overhead (imports, arg parsing, config, progress display) HACC adds per invocation
+## Exits non-zero if median startup time exceeds the budget
+##
+## Usage: python3 bench/startup_budget.py [--runs 10] [--budget 1.0]
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+HACC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hacc')
+STARTUP_BUDGET = 1.0 ## seconds
+FIRST_AWS_CALL_EXIT = 42
+
+## Minimal config so startup reaches the Vault component check without network calls
+BENCH_CONFIG = '''
+aws_hacc_region = 'us-east-1'
+aws_hacc_uname = 'hacc-user'
+aws_hacc_iam_policy = 'hacc-policy'
+aws_hacc_kms_alias = 'hacc-key'
+aws_hacc_param_path = 'hacc-vault'
+create_scp = 'False'
+check_for_upgrades = 'False'
+cleanup_old_versions = 'False'
+'''
+
+
+## Runs HACC entrypoint in this process, exits as soon as the first AWS client is created
+def run_child():
+    sys.path.insert(0, HACC_DIR)
+    sys.argv = ['hacc']
+
+    ## Entrypoint has no .py extension, load it explicitly
+    import importlib.util
+    from importlib.machinery import SourceFileLoader
+    loader = SourceFileLoader('hacc_main', os.path.join(HACC_DIR, 'hacc'))
+    hacc_main = importlib.util.module_from_spec(importlib.util.spec_from_loader('hacc_main', loader))
+    loader.exec_module(hacc_main)
+
+    import classes.aws_client
+    def first_aws_call(*args, **kwargs):
+        os._exit(FIRST_AWS_CALL_EXIT)
+    classes.aws_client.AwsClient.__init__ = first_aws_call
+
+    hacc_main.main()
+    os._exit(1) ## Never reached an AWS call, startup failed
+
+
+## Returns seconds from launching HACC until its first AWS call
+def time_startup(home_dir):
+    env = dict(os.environ, HOME=home_dir)
+    env.pop('USERPROFILE', None)
+
+    start = time.perf_counter()
+    res = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child'],
+        env = env,
+        stdout = subprocess.PIPE,
+        stderr = subprocess.STDOUT
+    )
+    elapsed = time.perf_counter() - start
+
+    if res.returncode != FIRST_AWS_CALL_EXIT:
+        print(res.stdout.decode())
+        print(f'HACC exited with code {res.returncode} before reaching an AWS call')
+        sys.exit(2)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HACC startup latency budget')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET, help='max median seconds before first AWS call')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+
+    with tempfile.TemporaryDirectory() as home_dir:
+        os.makedirs(os.path.join(home_dir, '.hacc'))
+        with open(os.path.join(home_dir, '.hacc', 'hacc.conf'), 'w') as f:
+            f.write(BENCH_CONFIG)
+
+        timings = [time_startup(home_dir) for _ in range(args.runs)]
+
+    median = statistics.median(timings)
+    print(json.dumps({
+        'runs': args.runs,
+        'min': round(min(timings), 3),
+        'median': round(median, 3),
+        'max': round(max(timings), 3),
+        'budget': args.budget
+    }))
+
+    if median > args.budget:
+        print(f'Startup median {median:.3f}s exceeds budget of {args.budget:.3f}s')
+        sys.exit(1)
+    print('Startup within budget')
+
+
+if __name__ == '__main__':
+    main()
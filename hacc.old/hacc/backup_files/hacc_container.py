@@ -0,0 +1,128 @@
+import os
+import json
+import zlib
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from logger.hacc_logger import logger
+
+## Compressed, indexed backup container:
+##   magic | chunk 0 | chunk 1 | ... | index | footer
+## Each chunk is zlib-compressed NDJSON credential records for a group of services
+## Index is zlib-compressed JSON {"chunks": [[offset, length], ...], "services": {"svc": chunk #}}
+## Footer holds index offset/length so a single service can be restored by seeking to its chunk
+CONTAINER_EXTENSIONS = ['.hacz']
+CONTAINER_MAGIC = b'HACZ\x01'
+FOOTER_FORMAT = '>QI5s'
+FOOTER_LEN = struct.calcsize(FOOTER_FORMAT)
+SERVICES_PER_CHUNK = 100
+COMPRESSION_LEVEL = 9
+PARTIAL_SUFFIX = '.partial'
+
+
+## Returns True if backup filename should be written as compressed container
+def is_container_filename(filename):
+    return os.path.splitext(filename)[1].lower() in CONTAINER_EXTENSIONS
+
+
+## Returns True if existing file is a compressed backup container
+def is_container_file(filename):
+    try:
+        with open(filename, 'rb') as f:
+            if f.read(len(CONTAINER_MAGIC)) != CONTAINER_MAGIC:
+                return False
+            f.seek(-FOOTER_LEN, os.SEEK_END)
+            return struct.unpack(FOOTER_FORMAT, f.read(FOOTER_LEN))[2] == CONTAINER_MAGIC
+    except:
+        return False
+
+
+## Writes compressed container from generator of (service, credentials) pairs
+## Chunks are compressed by a pool of threads (zlib releases the GIL) on multiple cores,
+##   and written in order with at most 2 chunks per worker held in memory
+## Raises on failure (OSError, zlib.error, or any error from svc_creds_iter), the partial file is removed
+## Returns number of services written
+def write_container(filename, svc_creds_iter, workers=None):
+    workers = workers or os.cpu_count() or 1
+    index = {'chunks': [], 'services': {}}
+    num_svcs = 0
+
+    ## Written under a temporary name so a failed backup never leaves a truncated container
+    partial_filename = filename + PARTIAL_SUFFIX
+    try:
+        with open(partial_filename, 'wb') as f, ThreadPoolExecutor(max_workers=workers) as executor:
+            f.write(CONTAINER_MAGIC)
+            pending = deque()
+
+            def write_next_chunk():
+                compressed = pending.popleft().result()
+                index['chunks'].append([f.tell(), len(compressed)])
+                f.write(compressed)
+
+            chunk_lines = []
+            chunk_svcs = 0
+            for svc, creds in svc_creds_iter:
+                index['services'][svc] = len(index['chunks']) + len(pending)
+                chunk_lines += [
+                    json.dumps({'service': svc, 'username': user, 'password': creds[user]}) + '\n'
+                    for user in creds
+                ]
+                chunk_svcs += 1
+                num_svcs += 1
+
+                if chunk_svcs == SERVICES_PER_CHUNK:
+                    pending.append(executor.submit(zlib.compress, ''.join(chunk_lines).encode(), COMPRESSION_LEVEL))
+                    chunk_lines = []
+                    chunk_svcs = 0
+                    if len(pending) >= workers * 2:
+                        write_next_chunk()
+
+            if chunk_svcs:
+                pending.append(executor.submit(zlib.compress, ''.join(chunk_lines).encode(), COMPRESSION_LEVEL))
+            while pending:
+                write_next_chunk()
+
+            index_offset = f.tell()
+            compressed_index = zlib.compress(json.dumps(index).encode(), COMPRESSION_LEVEL)
+            f.write(compressed_index)
+            f.write(struct.pack(FOOTER_FORMAT, index_offset, len(compressed_index), CONTAINER_MAGIC))
+        os.replace(partial_filename, filename)
+    except BaseException:
+        try:
+            os.remove(partial_filename)
+        except OSError:
+            pass
+        raise
+
+    logger.debug(f'Wrote {num_svcs} services in {len(index["chunks"])} chunks to {filename}')
+    return num_svcs
+
+
+## Returns container index dict read from footer
+def read_container_index(f):
+    f.seek(-FOOTER_LEN, os.SEEK_END)
+    index_offset, index_len, _ = struct.unpack(FOOTER_FORMAT, f.read(FOOTER_LEN))
+    f.seek(index_offset)
+    return json.loads(zlib.decompress(f.read(index_len)))
+
+
+## Generator yielding credential records from compressed container
+## Optional services restricts records to set of service names,
+##   only the chunks holding those services are read and decompressed
+def read_container_records(filename, services=None):
+    with open(filename, 'rb') as f:
+        index = read_container_index(f)
+
+        if services == None:
+            chunk_nums = range(len(index['chunks']))
+        else:
+            chunk_nums = sorted(set(index['services'][svc] for svc in services if svc in index['services']))
+
+        for chunk_num in chunk_nums:
+            offset, length = index['chunks'][chunk_num]
+            f.seek(offset)
+            for line in zlib.decompress(f.read(length)).decode().splitlines():
+                record = json.loads(line)
+                if services == None or record['service'] in services:
+                    yield record
@@ -0,0 +1,65 @@
+import re
+import json
+import mmap
+import codecs
+
+from logger.hacc_logger import logger
+
+## Legacy single JSON backup format:
+##   {"creds_list": [{"service": "svc", "username": "user", "password": "pass"}, ...]}
+## Parsed incrementally from a memory-mapped file, one record at a time
+LEGACY_PREFIX = re.compile(rb'\s*\{\s*"creds_list"\s*:\s*\[')
+READ_WINDOW = 64 * 1024
+
+
+## Returns True if existing file starts like a legacy backup
+## Only inspects the first bytes, file isn't parsed
+def is_legacy_file(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return bool(LEGACY_PREFIX.match(f.read(READ_WINDOW)))
+    except:
+        return False
+
+
+## Generator yielding credential records from legacy backup file
+## Records are decoded from a sliding window over the memory-mapped file,
+##   so memory use is bounded by the window and the largest single record
+## Optional services restricts records to set of service names
+## Raises ValueError if file is malformed
+def read_legacy_records(filename, services=None):
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        prefix = LEGACY_PREFIX.match(mm[:READ_WINDOW])
+        if not prefix:
+            raise ValueError(f'{filename} is not a legacy backup file')
+
+        read_pos = prefix.end()
+        buf = ''
+        pos = 0
+
+        while True:
+            ## Skip separators between records
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+
+            if pos < len(buf) and buf[pos] == ']':
+                logger.debug(f'Finished reading legacy backup file {filename}')
+                return
+
+            try:
+                record, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                ## Record may continue past current window, slide window forward
+                if read_pos >= len(mm):
+                    raise ValueError(f'Unexpected end of legacy backup file {filename}')
+
+                buf = buf[pos:] + utf8_decoder.decode(mm[read_pos:read_pos+READ_WINDOW])
+                read_pos += READ_WINDOW
+                pos = 0
+                continue
+
+            if services == None or record['service'] in services:
+                yield record
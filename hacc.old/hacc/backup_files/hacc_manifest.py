@@ -0,0 +1,63 @@
+import os
+import json
+
+from logger.hacc_logger import logger
+
+## Sidecar manifest written next to every streaming backup:
+##   {"base": "previous.ndjson" or null,
+##    "services": {"svc": {"version": 3, "modified": "2024-01-01T00:00:00+00:00"}, ...}}
+## Incremental backups only contain services that changed since their base backup
+## Manifest describes what the backup chain holds, not the Vault at the end of the run:
+##   each service maps to the version its records were written at, in this file or in the base chain
+##   service_changed trusts it completely, an entry newer than the stored records hides a change forever
+MANIFEST_SUFFIX = '.manifest'
+
+
+def get_manifest_filename(filename):
+    return filename + MANIFEST_SUFFIX
+
+
+## Returns manifest dict for backup file, None if missing or unreadable
+def read_manifest(filename):
+    manifest_file = get_manifest_filename(filename)
+    try:
+        with open(manifest_file, 'r') as f:
+            manifest = json.loads(f.read())
+    except:
+        logger.debug(f'Could not read backup manifest {manifest_file}')
+        return None
+
+    if 'services' not in manifest:
+        logger.debug(f'Backup manifest {manifest_file} missing service versions')
+        return None
+    return manifest
+
+
+## Atomically writes manifest of service versions for backup file
+def write_manifest(filename, svc_versions, base=None):
+    manifest_file = get_manifest_filename(filename)
+    tmp_file = manifest_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write(json.dumps({'base': base, 'services': svc_versions}, sort_keys=True))
+    os.replace(tmp_file, manifest_file)
+
+
+## Returns base path recorded relative to new backup file, so backup chains can be moved together
+def get_relative_base(filename, base_filename):
+    backup_dir = os.path.dirname(os.path.abspath(filename))
+    return os.path.relpath(os.path.abspath(base_filename), backup_dir)
+
+
+## Resolves base path recorded in backup header against backup file location
+def resolve_base(filename, base):
+    backup_dir = os.path.dirname(os.path.abspath(filename))
+    return os.path.join(backup_dir, base)
+
+
+## Returns True if service version differs from the one stored in base backup chain
+def service_changed(svc, svc_version, base_manifest):
+    base_version = base_manifest['services'].get(svc)
+    if not base_version:
+        return True
+    ## Version resets to 1 if parameter deleted and recreated, compare modified date too
+    return base_version['version'] != svc_version['version'] or base_version['modified'] != svc_version['modified']
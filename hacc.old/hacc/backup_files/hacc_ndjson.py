@@ -0,0 +1,186 @@
+import os
+import json
+
+from logger.hacc_logger import logger
+from backup_files.hacc_manifest import read_manifest, resolve_base
+
+## Streaming backup format, one JSON record per line:
+##   {"hacc_backup": "ndjson", "version": 1}
+##   {"service": "svc", "username": "user", "password": "pass"}
+##   ...
+## Incremental backups add "base": "<previous backup>" to the header
+## While a backup is in progress, a version log sidecar records the Vault version of every
+##   service as its records are written, one {"service": "svc", "version": {...}} line each,
+##   so the manifest only describes what the file actually contains
+NDJSON_EXTENSIONS = ['.ndjson', '.jsonl']
+NDJSON_HEADER = {'hacc_backup': 'ndjson', 'version': 1}
+CHECKPOINT_SUFFIX = '.checkpoint'
+VERSION_LOG_SUFFIX = '.versions'
+MAX_HEADER_LEN = 4096
+
+
+## Returns True if backup filename should be written in streaming format
+def is_ndjson_filename(filename):
+    return os.path.splitext(filename)[1].lower() in NDJSON_EXTENSIONS
+
+
+## Returns header dict if existing file starts with streaming backup header, None otherwise
+## Only reads first line so legacy single-blob backups aren't loaded into memory
+def read_header(filename):
+    try:
+        with open(filename, 'r') as f:
+            header = json.loads(f.readline(MAX_HEADER_LEN))
+        if header.get('hacc_backup') == NDJSON_HEADER['hacc_backup']:
+            return header
+    except:
+        pass
+    return None
+
+
+## Returns True if existing file is a streaming backup
+## Incremental backups also need a readable manifest to restore unchanged services
+def is_ndjson_file(filename):
+    header = read_header(filename)
+    if not header:
+        return False
+    if header.get('base') and not read_manifest(filename):
+        logger.debug(f'Incremental backup {filename} missing manifest, cannot restore')
+        return False
+    return True
+
+
+def get_checkpoint_filename(filename):
+    return filename + CHECKPOINT_SUFFIX
+
+
+def get_version_log_filename(filename):
+    return filename + VERSION_LOG_SUFFIX
+
+
+## Returns checkpoint dict of form
+##   {'service': last completed, 'offset': bytes written, 'versions_offset': version log bytes written}
+## Returns None if no resumable checkpoint exists for backup file
+def get_checkpoint(filename):
+    checkpoint_file = get_checkpoint_filename(filename)
+    if not os.path.exists(checkpoint_file) or not os.path.exists(filename):
+        return None
+    if not os.path.exists(get_version_log_filename(filename)):
+        logger.debug(f'Ignoring backup checkpoint {checkpoint_file} without version log')
+        return None
+
+    try:
+        with open(checkpoint_file, 'r') as f:
+            checkpoint = json.loads(f.read())
+        return {
+            'service': checkpoint['service'],
+            'offset': int(checkpoint['offset']),
+            'versions_offset': int(checkpoint['versions_offset'])
+        }
+    except:
+        logger.debug(f'Ignoring unreadable backup checkpoint {checkpoint_file}')
+        return None
+
+
+## Atomically records last completed service and file offsets after its records
+def write_checkpoint(filename, service, offset, versions_offset):
+    checkpoint_file = get_checkpoint_filename(filename)
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write(json.dumps({'service': service, 'offset': offset, 'versions_offset': versions_offset}))
+    os.replace(tmp_file, checkpoint_file)
+
+
+## Removes checkpoint and version log once backup and its manifest are complete
+def remove_checkpoint(filename):
+    for sidecar_file in [get_checkpoint_filename(filename), get_version_log_filename(filename)]:
+        if os.path.exists(sidecar_file):
+            os.remove(sidecar_file)
+
+
+## Returns dict of service:version read from version log file obj, up to its current position
+def read_version_log(versions_f):
+    end = versions_f.tell()
+    versions_f.seek(0)
+    written_versions = {}
+    for line in versions_f.read(end).decode().splitlines():
+        entry = json.loads(line)
+        written_versions[entry['service']] = entry['version']
+    return written_versions
+
+
+## Opens streaming backup file and its version log for writing, resuming from checkpoint if one exists
+## Optional base records previous backup this incremental backup chains to
+## Returns tuple of (binary file obj, version log file obj, last completed service or None,
+##   dict of service:version already written to file)
+def open_backup_for_write(filename, base=None):
+    checkpoint = get_checkpoint(filename)
+
+    if checkpoint:
+        ## Drop any partial records and versions written after the last completed service
+        f = open(filename, 'r+b')
+        f.truncate(checkpoint['offset'])
+        f.seek(checkpoint['offset'])
+
+        versions_f = open(get_version_log_filename(filename), 'r+b')
+        versions_f.truncate(checkpoint['versions_offset'])
+        versions_f.seek(checkpoint['versions_offset'])
+        return f, versions_f, checkpoint['service'], read_version_log(versions_f)
+
+    header = dict(NDJSON_HEADER, base=base) if base else NDJSON_HEADER
+    f = open(filename, 'wb')
+    f.write((json.dumps(header) + '\n').encode())
+    f.flush()
+    versions_f = open(get_version_log_filename(filename), 'wb')
+    write_checkpoint(filename, None, f.tell(), 0)
+    return f, versions_f, None, {}
+
+
+## Appends all records for service, then its version to the version log, flushes and checkpoints
+## Returns file offset after service records
+def write_service_records(f, versions_f, filename, service, creds, svc_version):
+    lines = ''.join(
+        json.dumps({'service': service, 'username': user, 'password': creds[user]}) + '\n'
+        for user in creds
+    )
+    f.write(lines.encode())
+    f.flush()
+
+    versions_f.write((json.dumps({'service': service, 'version': svc_version}) + '\n').encode())
+    versions_f.flush()
+
+    offset = f.tell()
+    write_checkpoint(filename, service, offset, versions_f.tell())
+    return offset
+
+
+## Generator yielding credential records from streaming backup file, one line at a time
+## Assumes header already validated with is_ndjson_file
+## Incremental backups then yield unchanged services from their base backup chain
+## Optional services restricts records to set of service names
+def read_backup_records(filename, services=None):
+    seen_svcs = set()
+
+    with open(filename, 'r') as f:
+        header = json.loads(f.readline(MAX_HEADER_LEN))
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            record = json.loads(line)
+            if services != None and record['service'] not in services:
+                continue
+            seen_svcs.add(record['service'])
+            yield record
+
+    if not header.get('base'):
+        return
+
+    ## Every service in a backup is complete, only look further back for the rest
+    live_svcs = set(read_manifest(filename)['services'])
+    if services != None:
+        live_svcs &= services
+    remaining_svcs = live_svcs - seen_svcs
+
+    if remaining_svcs:
+        yield from read_backup_records(resolve_base(filename, header['base']), remaining_svcs)
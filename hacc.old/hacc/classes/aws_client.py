@@ -2,6 +2,7 @@ import sys
 
 try:
     import boto3
+    from botocore.config import Config
     from botocore.exceptions import ClientError
 except:
     print('Python module boto3 required for HACC client. Install (pip install boto3) and try again.')
@@ -10,10 +11,25 @@ except:
 from logger.hacc_logger import logger
 from console.hacc_console import console
 
+DEFAULT_MAX_WORKERS = 1 ## Bulk Vault operations run sequentially unless configured
+ACCESS_DENIED_ERROR_CODES = ['AccessDenied', 'AccessDeniedException']
+NOT_FOUND_ERROR_CODES = ['NotFoundException', 'NoSuchEntity', 'ParameterNotFound']
+
+
+## Returns number of concurrent workers for bulk Vault operations from config
+## Falls back to DEFAULT_MAX_WORKERS if unset or invalid
+def get_max_workers(config):
+    try:
+        return max(1, int(config.get('max_workers', DEFAULT_MAX_WORKERS)))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_WORKERS
+
 
 
 ## AwsClient Object:
 ##      Creates boto3 clients for interaction with Vault services
+##      All clients are created up front, boto3 clients are safe to share across threads
+##      Data clients size their connection pool to max_workers for concurrent calls
 ## Attributes:
 ##      ssm, boto3 client obj
 ##      kms, boto3 client obj
@@ -30,9 +46,13 @@ class AwsClient:
         ## If API client is for data operations, only need SSM and KMS clients
         if client_type == 'data':
             hacc_session = boto3.session.Session(profile_name=config['aws_hacc_uname'])
+            client_config = Config(
+                                max_pool_connections = max(10, get_max_workers(config)),
+                                retries = {'mode': 'standard'}
+                            )
 
-            self.ssm = hacc_session.client('ssm', region_name=region)
-            self.kms = hacc_session.client('kms', region_name=region)
+            self.ssm = hacc_session.client('ssm', region_name=region, config=client_config)
+            self.kms = hacc_session.client('kms', region_name=region, config=client_config)
 
         ## Install/eradicate action clients
         if client_type == 'mgmt':
@@ -77,6 +97,16 @@ class AwsClient:
     ## Execute generic AWS API call with basic error handling
     ## Returns result of api call, or False if call failed
     def call(self, client_type, api_name, **kwargs):
+        result, _ = self.call_with_error(client_type, api_name, **kwargs)
+        return result
+
+
+    ## Execute generic AWS API call, also returning the AWS error code on failure
+    ## Lets callers tell a missing resource apart from throttling, access or network failures
+    ## Returns tuple of (result, None) on success, (False, error code) if call failed
+    ##   error code is 'Unknown' if the call failed without an AWS error response
+    ## report_denied=False skips the not authorized message for callers with a fallback
+    def call_with_error(self, client_type, api_name, report_denied=True, **kwargs):
         client = None
         if client_type == 'ssm':
             client = self.ssm
@@ -93,23 +123,26 @@ class AwsClient:
             method_to_call = getattr(client, api_name)
         except:
             console.print(f'API {api_name} not known for {client_type} client, exiting')
-            return False
+            return False, 'Unknown'
 
         try:
             result = method_to_call(**kwargs)
             ## add leading spaces for cleaner debug output
             logger.debug(f'    {api_name} API execution successful') 
-            return result
+            return result, None
 
         except ClientError as e:
-            if e.response['Error'] and e.response['Error']['Code'] in ['AccessDenied', 'AccessDeniedException']:
+            error_code = e.response['Error']['Code'] if e.response.get('Error') else 'Unknown'
+            if error_code in ACCESS_DENIED_ERROR_CODES and report_denied:
                 console.print(f'HACC is not authorized to perform required action {client_type} {api_name}, exiting')
-            elif e.response['Error'] and e.response['Error']['Code'] in ['NotFoundException', 'NoSuchEntity']:
+            elif error_code in ACCESS_DENIED_ERROR_CODES:
+                logger.debug(f'Access denied received from AWS client: {e}')
+            elif error_code in NOT_FOUND_ERROR_CODES:
                 logger.debug(f'Resource not found exception received from AWS client: {e}')
             else:
                 logger.debug(f'AWS client error: {e}')
-            return False
+            return False, error_code
 
         except Exception as e:
             console.print(f'Unknown API error, exiting: {e}')
-            return False
+            return False, 'Unknown'
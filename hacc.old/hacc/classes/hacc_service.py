@@ -1,7 +1,11 @@
 import sys
+import time
+import secrets
 
 from logger.hacc_logger import logger
-from classes.vault import Vault
+from classes.vault import Vault, parse_credentials_string
+
+MAX_WRITE_ATTEMPTS = 5 ## Retries when a concurrent write to the same service is detected
 
 
 ## HaccService Object:
@@ -11,75 +15,164 @@ from classes.vault import Vault
 ##      service_name, string
 ##      vault, Vault obj
 ##      credentials, dict of user:passwd
+##      version, SSM parameter Version credentials were read at, 0 if service not in Vault
+##      pending_mutations, list of (op, user, passwd) applied since last successful push
 ## 
 ## Methods:
 ##      pull_from_vault
+##      __rebase
+##      __put_to_vault
 ##      push_to_vault
 ##      get_users
 ##      get_credential
 ##      user_exists
 ##      add_credential
+##      update_credential
 ##      remove_credential
+##      __record_mutation
 class HaccService:
 
-    ## Pulls creds from Vault and updates self.credentials
+    ## Pulls creds from Vault and updates self.credentials and self.version
+    ## Single get_parameter request, no listing of the Vault required
+    ## Returns False if service doesn't exist in Vault, True otherwise
+    ## Exits if the service could not be read, see Vault.get_service_parameter
     def pull_from_vault(self):
-        vault_path = self.vault.param_path
+        creds_param = self.vault.get_service_parameter(self.service_name)
+        if not creds_param:
+            return False
 
         try:
-            creds_string = self.vault.aws_client.call(
-                'ssm', 'get_parameter', 
-                Name = f'/{vault_path}/{self.service_name}',
-                WithDecryption = True
-            )['Parameter']['Value']
-
+            creds_string = creds_param['Value']
             logger.debug('Successfully pulled credential data from Vault')
 
-            # Parse credential string of form 'user1:pass1,user2:pass2,etc'
-            creds_dict = {}
-            creds_list = creds_string.split(',')
-            for cred in creds_list:
-                user, passwd = cred.split(':')
-                creds_dict[user] = passwd
-
-            self.credentials = creds_dict
+            self.credentials = parse_credentials_string(creds_string)
+            self.version = creds_param['Version']
+            return True
 
         except Exception as e:
             print(f'Unexpected error retrieving credential, exiting: {e}')
             sys.exit(99)
 
 
-    ## Pushes self.credentials to Vault if at least one credential present
-    ## Otherwise delete service from Vault if all creds removed
-    def push_to_vault(self):
+    ## Replaces self.credentials with Vault state at provided version and re-applies pending mutations
+    ## Version 0 means service no longer exists in Vault
+    ## Returns False if version no longer exists, exits on any other read failure
+    def __rebase(self, version):
+        if version == 0:
+            creds = {}
+        else:
+            creds_param = self.vault.get_service_parameter(self.service_name, version=version)
+            if not creds_param:
+                return False
+            creds = parse_credentials_string(creds_param['Value'])
+
+        for op, user, passwd in self.pending_mutations:
+            if op == 'add':
+                creds.setdefault(user, passwd)
+            elif op == 'update' and user in creds:
+                creds[user] = passwd
+            elif op == 'remove':
+                creds.pop(user, None)
+
+        logger.debug(f'Re-applied {len(self.pending_mutations)} pending changes to {self.service_name} version {version}')
+        self.credentials = creds
+        return True
+
+
+    ## Puts self.credentials, overwriting service parameter
+    ## Returns Version created by the write, False if write failed
+    def __put_to_vault(self):
         svc_creds = self.credentials
-        vault_path = self.vault.param_path
-        kms_id = self.vault.kms_arn
-        
+
         ## Create parameter string from dict of form {user1:pass1,user2:pass2,etc}
         param_string = ''
         for user in svc_creds:
             param_string += f'{user}:{svc_creds[user]},'
 
-        if not param_string:
-            self.vault.aws_client.call(
-                'ssm', 'delete_parameter', 
-                Name=f'/{vault_path}/{self.service_name}'
-            )
-            logger.debug('Successfully removed service with no more credentials from Vault')
+        put_res = self.vault.aws_client.call(
+            'ssm', 'put_parameter',
+            Name = f'/{self.vault.param_path}/{self.service_name}',
+            Value = param_string[:-1], ## remove final comma
+            Type = 'SecureString',
+            KeyId = self.vault.kms_arn,
+            Overwrite = True,
+            Tier = 'Standard',
+            DataType = 'text'
+        )
+        if not put_res:
+            return False
+        return put_res['Version']
+
 
-        else:
-            self.vault.aws_client.call(
-                'ssm', 'put_parameter',
-                Name = f'/{vault_path}/{self.service_name}',
-                Value = param_string[:-1], ## remove final comma
-                Type = 'SecureString',
-                KeyId = kms_id,
-                Overwrite = True,
-                Tier = 'Standard',
-                DataType = 'text'
-            )
-            logger.debug('Successfully pushed updated credential data to Vault')
+    ## Pushes self.credentials to Vault if at least one credential present
+    ## Otherwise delete service from Vault if all creds removed
+    ## Inside Vault.batch() the write is deferred until the batch is flushed
+    ##
+    ## Optimistic concurrency, SSM has no conditional put so conflicts are detected by Version:
+    ##   a put should create version self.version+1, anything higher means another client wrote
+    ##   in between and was overwritten. Their version is re-read, pending mutations re-applied
+    ##   and the write retried. Deletes check the current version first.
+    ## Returns False if Vault write failed, True otherwise
+    def push_to_vault(self):
+        if self.vault.register_batch_service(self):
+            logger.debug(f'Deferred write of service {self.service_name} until batch flush')
+            return True
+
+        ## Remaining lost-update window: SSM has no conditional put, a conflict is only seen after
+        ##   our write lands and we rebase on the single version it overwrote (new_version-1).
+        ##   If a third writer interleaves, e.g. A writes v+1, stale B overwrites it with v+2,
+        ##   then we write v+3, we rebase on B's v+2 which lacks A's changes. B rebases on A's v+1
+        ##   but its retry lands on top of ours, so A's changes can be lost. A put landing between
+        ##   the delete path's version check and delete_parameter is lost the same way.
+        ##   Closing this needs a lock outside SSM.
+        for attempt in range(MAX_WRITE_ATTEMPTS):
+            if attempt:
+                ## Jittered backoff so competing clients don't collide again
+                time.sleep((2 ** attempt + secrets.randbelow(1000) / 1000) / 20)
+
+            ## Only delete service if nobody changed it since it was read
+            if not self.credentials:
+                curr_param = self.vault.get_service_parameter(self.service_name, decrypt=False)
+                curr_version = curr_param['Version'] if curr_param else 0
+
+                if curr_version != 0 and curr_version != self.version:
+                    logger.debug(f'Service {self.service_name} changed to version {curr_version} since read, retrying')
+                    if not self.__rebase(curr_version):
+                        return False
+                    self.version = curr_version
+                    continue
+
+                if curr_version != 0:
+                    delete_res = self.vault.aws_client.call(
+                        'ssm', 'delete_parameter', 
+                        Name=f'/{self.vault.param_path}/{self.service_name}'
+                    )
+                    if not delete_res:
+                        return False
+
+                logger.debug('Successfully removed service with no more credentials from Vault')
+                self.version = 0
+                self.pending_mutations = []
+                return True
+
+            new_version = self.__put_to_vault()
+            if new_version == False:
+                return False
+
+            expected_version = self.version + 1
+            self.version = new_version
+            if new_version == expected_version:
+                logger.debug('Successfully pushed updated credential data to Vault')
+                self.pending_mutations = []
+                return True
+
+            ## Rebase on the version our write overwrote, next put must create new_version+1
+            logger.debug(f'Concurrent write to {self.service_name} detected, expected version {expected_version} got {new_version}')
+            if not self.__rebase(new_version - 1):
+                return False
+
+        logger.debug(f'Gave up writing {self.service_name} after {MAX_WRITE_ATTEMPTS} conflicting attempts')
+        return False
 
 
     ## Returns list of all usernames associated with service
@@ -106,6 +199,18 @@ class HaccService:
     def add_credential(self, user, passwd):
         if not user in self.credentials:
             self.credentials[user] = passwd
+            self.__record_mutation('add', user, passwd)
+            return True
+        else:
+            return False
+
+
+    ## Replaces password for existing user in self.credentials
+    ## Returns False if user doesn't exist, True if success
+    def update_credential(self, user, passwd):
+        if user in self.credentials:
+            self.credentials[user] = passwd
+            self.__record_mutation('update', user, passwd)
             return True
         else:
             return False
@@ -116,21 +221,50 @@ class HaccService:
     def remove_credential(self, user):
         if user in self.credentials:
             self.credentials.pop(user)
+            self.__record_mutation('remove', user)
             return True
         else:
             return False
 
 
+    ## Journals mutation so it can be re-applied if a concurrent write is detected
+    ## Marks service as touched in active Vault batch
+    ## If another obj for the same service is already in the batch, apply mutation there too
+    ##   so the service is still flushed with a single write
+    def __record_mutation(self, op, user, passwd=None):
+        self.pending_mutations.append((op, user, passwd))
+
+        registered = self.vault.register_batch_service(self)
+        if registered == None or registered is self:
+            return
+
+        if op == 'add':
+            registered.add_credential(user, passwd)
+        elif op == 'update':
+            registered.update_credential(user, passwd)
+        elif op == 'remove':
+            registered.remove_credential(user)
+
+
     ## Upon object init, pull existing service data if it exists
     ## Either provide config to initialize new vault, or existing vault object
-    def __init__(self, service_name, config=None, vault=None):
+    ## Credentials already pulled from Vault (e.g. batched fetch) skip the lookup,
+    ##   provide the parameter version they were read at (0 if service not in Vault)
+    def __init__(self, service_name, config=None, vault=None, credentials=None, version=0):
         self.vault = Vault(config) if vault == None else vault
         self.service_name = service_name
+        self.pending_mutations = []
+
+        if credentials != None:
+            self.credentials = credentials
+            self.version = version
+            return
+
+        ## Fetch service directly, ParameterNotFound means new service
+        if self.pull_from_vault():
+            logger.debug(f'Found existing service "{service_name}" in Vault, pulled data')
 
-        if self.vault.service_exists(service_name):
-            logger.debug(f'Found existing service "{service_name}" in Vault, pulling data')
-            self.pull_from_vault()
-            
         else:
             self.credentials = {}
+            self.version = 0
             logger.debug(f'Did not find existing service {service_name} in Vault, creating new')
\ No newline at end of file
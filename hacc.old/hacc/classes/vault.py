@@ -1,7 +1,26 @@
-import json
+import sys
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 from logger.hacc_logger import logger
-from classes.aws_client import AwsClient
+from classes.aws_client import AwsClient, get_max_workers, ACCESS_DENIED_ERROR_CODES
+
+from backup_files.hacc_ndjson import is_ndjson_file, read_backup_records
+from backup_files.hacc_container import is_container_file, read_container_records
+from backup_files.hacc_legacy import is_legacy_file, read_legacy_records
+
+MAX_PARAMS_PER_GET = 10 ## SSM get_parameters accepts at most 10 names per call
+
+
+## Parse credential string of form 'user1:pass1,user2:pass2,etc'
+## Returns dict of user:passwd
+def parse_credentials_string(creds_string):
+    creds_dict = {}
+    for cred in creds_string.split(','):
+        user, passwd = cred.split(':')
+        creds_dict[user] = passwd
+    return creds_dict
 
 
 ## Vault Object:
@@ -10,18 +29,36 @@ from classes.aws_client import AwsClient
 ##      aws_client, AwsClient obj
 ##      kms_arn, string
 ##      param_path, string
+##      max_workers, int
+##      batch_services, dict of service:HaccService touched in active batch, None outside batch
+##      failed_batch_services, list of service names that failed to flush in last batch
+##      batch_get_denied, bool, True once ssm:GetParameters was denied (Vaults installed before it was granted)
 ## 
 ## Methods:
 ##      get_all_services
+##      snapshot
+##      get_service_versions
+##      get_service_parameter
+##      get_services
+##      iter_services_concurrently
+##      delete_services
 ##      service_exists
+##      batch
+##      register_batch_service
+##      flush_services
 ##      get_kms_arn
 ##      parse_import_file
 ##          
 class Vault:
     def __init__(self, config):
         self.aws_client = AwsClient(config, client_type='data')
-        self.kms_arn = self.get_kms_arn(config['aws_hacc_kms_alias'])
+        ## Reuse key ARN already found by startup component check instead of describing key again
+        self.kms_arn = config.get('aws_hacc_kms_arn') or self.get_kms_arn(config['aws_hacc_kms_alias'])
         self.param_path = config['aws_hacc_param_path']
+        self.max_workers = get_max_workers(config)
+        self.batch_services = None
+        self.failed_batch_services = []
+        self.batch_get_denied = False
 
 
     ## Return all service names stored in Vault
@@ -50,6 +87,9 @@ class Vault:
                             WithDecryption = False,
                             NextToken = curr_params['NextToken']
                         )
+            if not more_params:
+                logger.debug('Failed to pull Vault services')
+                return False
             all_svc_list += more_params['Parameters']
             curr_params = more_params
 
@@ -61,15 +101,311 @@ class Vault:
 
 
 
+    ## Generator yielding (service, credentials dict) for every service in Vault
+    ## Decrypts whole Vault in one paged get_parameters_by_path sweep,
+    ##   pairs are yielded as each page arrives instead of re-fetching every service
+    ## Raises RuntimeError if a page cannot be retrieved, callers must not treat
+    ##   a partial snapshot as the whole Vault
+    def snapshot(self):
+        logger.debug('Retrieving decrypted snapshot of Vault')
+        path_prefix = f'/{self.param_path}/'
+        next_token = None
+
+        while True:
+            page_args = {'NextToken': next_token} if next_token else {}
+            curr_params = self.aws_client.call(
+                            'ssm', 'get_parameters_by_path',
+                            Path = '/'+self.param_path,
+                            Recursive = True,
+                            WithDecryption = True,
+                            **page_args
+                        )
+
+            if not curr_params:
+                raise RuntimeError('Unexpected error retrieving Vault snapshot')
+
+            for param in curr_params['Parameters']:
+                ## Example service Name: /hacc-vault/test
+                svc = param['Name'][len(path_prefix):]
+                yield svc, parse_credentials_string(param['Value'])
+
+            if 'NextToken' not in curr_params:
+                break
+            next_token = curr_params['NextToken']
+
+        logger.debug('Finished Vault snapshot')
+
+
+
+    ## Returns dict of service:{'version', 'modified'} for every service in Vault
+    ## Uses paged get_parameters_by_path metadata, nothing is decrypted
+    ##   (describe_parameters would need access to every parameter in the account)
+    ## Returns False if failure
+    def get_service_versions(self):
+        logger.debug('Retrieving service versions from Vault')
+        path_prefix = f'/{self.param_path}/'
+        svc_versions = {}
+        next_token = None
+
+        while True:
+            page_args = {'NextToken': next_token} if next_token else {}
+            curr_params = self.aws_client.call(
+                            'ssm', 'get_parameters_by_path',
+                            Path = '/'+self.param_path,
+                            Recursive = True,
+                            WithDecryption = False,
+                            **page_args
+                        )
+
+            if not curr_params:
+                logger.debug('Failed to retrieve Vault service versions')
+                return False
+
+            for param in curr_params['Parameters']:
+                svc = param['Name'][len(path_prefix):]
+                svc_versions[svc] = {
+                    'version': param['Version'],
+                    'modified': param['LastModifiedDate'].isoformat()
+                }
+
+            if 'NextToken' not in curr_params:
+                break
+            next_token = curr_params['NextToken']
+
+        logger.debug(f'Gathered versions for {len(svc_versions)} services from Vault')
+        return svc_versions
+
+
+
+    ## Returns SSM parameter for service with a single get_parameter request
+    ## Optional version selects a previous version of the service parameter
+    ## Returns False only if service (or version) doesn't exist in Vault
+    ## Exits on any other failure (throttling, access, KMS, network), treating an
+    ##   unreadable service as new would overwrite its credentials
+    def get_service_parameter(self, service, decrypt=True, version=None):
+        version_selector = f':{version}' if version else ''
+        svc_param, error_code = self.aws_client.call_with_error(
+                        'ssm', 'get_parameter',
+                        Name = f'/{self.param_path}/{service}{version_selector}',
+                        WithDecryption = decrypt
+                    )
+
+        if error_code in ['ParameterNotFound', 'ParameterVersionNotFound']:
+            logger.debug(f'Service {service} not found in Vault')
+            return False
+        if error_code:
+            print(f'Unexpected error retrieving service {service} from Vault ({error_code}), exiting')
+            sys.exit(99)
+        return svc_param['Parameter']
+
+
+
+    ## Decrypts up to 10 services with a single get_parameters call
+    ## ssm:GetParameters is only granted to Vault users installed since batched reads were added,
+    ##   if denied falls back to one get_parameter call per service for the rest of the session
+    ## Optional found_versions dict is filled with service:parameter Version
+    ## Returns dict of service:credentials for services found in Vault, False if failure
+    def __get_services_batch(self, names_chunk, found_versions=None):
+        if self.batch_get_denied:
+            return self.__get_services_individually(names_chunk, found_versions)
+
+        svc_params, error_code = self.aws_client.call_with_error(
+                        'ssm', 'get_parameters',
+                        report_denied = False,
+                        Names = [f'/{self.param_path}/{svc}' for svc in names_chunk],
+                        WithDecryption = True
+                    )
+
+        if error_code in ACCESS_DENIED_ERROR_CODES:
+            logger.debug('Vault user not allowed ssm:GetParameters, falling back to get_parameter per service')
+            self.batch_get_denied = True
+            return self.__get_services_individually(names_chunk, found_versions)
+
+        if error_code:
+            logger.debug('Failed to pull batch of Vault services')
+            return False
+
+        found_creds = {}
+        for param in svc_params['Parameters']:
+            svc = param['Name'][len(self.param_path)+2:]
+            found_creds[svc] = parse_credentials_string(param['Value'])
+            if found_versions != None:
+                found_versions[svc] = param['Version']
+        return found_creds
+
+
+
+    ## Decrypts services with one get_parameter call each, fallback for __get_services_batch
+    ## Optional found_versions dict is filled with service:parameter Version
+    ## Returns dict of service:credentials for services found in Vault, False if failure
+    def __get_services_individually(self, names_chunk, found_versions=None):
+        found_creds = {}
+        for svc in names_chunk:
+            svc_param, error_code = self.aws_client.call_with_error(
+                            'ssm', 'get_parameter',
+                            Name = f'/{self.param_path}/{svc}',
+                            WithDecryption = True
+                        )
+
+            if error_code == 'ParameterNotFound':
+                continue
+            if error_code:
+                logger.debug(f'Failed to pull service {svc} from Vault')
+                return False
+
+            found_creds[svc] = parse_credentials_string(svc_param['Parameter']['Value'])
+            if found_versions != None:
+                found_versions[svc] = svc_param['Parameter']['Version']
+        return found_creds
+
+
+
+    ## Returns list of HaccService objs for provided service names, same order as names
+    ## Decrypts up to 10 services per get_parameters call, per service if GetParameters is denied
+    ## Services not found in Vault are returned with no credentials
+    ## Returns False if failure
+    def get_services(self, names):
+        ## Avoid circular import, HaccService depends on Vault
+        from classes.hacc_service import HaccService
+
+        names = list(dict.fromkeys(names))
+        found_creds = {}
+        found_versions = {}
+
+        for i in range(0, len(names), MAX_PARAMS_PER_GET):
+            batch_creds = self.__get_services_batch(names[i:i+MAX_PARAMS_PER_GET], found_versions)
+            if batch_creds == False:
+                return False
+            found_creds.update(batch_creds)
+
+        logger.debug(f'Pulled {len(found_creds)}/{len(names)} requested services from Vault')
+        return [
+            HaccService(svc, vault=self, credentials=found_creds.get(svc, {}), version=found_versions.get(svc, 0))
+            for svc in names
+        ]
+
+
+
+    ## Generator yielding (service, credentials dict) for provided names, same order as names
+    ## Batches of 10 names are decrypted concurrently by a bounded pool of workers,
+    ##   at most 2 batches per worker are held in memory at once
+    ## Services in a failed batch yield False credentials so callers can continue
+    ## Services not found in Vault yield no credentials
+    def iter_services_concurrently(self, names, workers):
+        names = list(dict.fromkeys(names))
+        chunks = [names[i:i+MAX_PARAMS_PER_GET] for i in range(0, len(names), MAX_PARAMS_PER_GET)]
+        max_pending = workers * 2
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            next_chunk = 0
+
+            while pending or next_chunk < len(chunks):
+                ## Keep workers busy ahead of the consumer
+                while next_chunk < len(chunks) and len(pending) < max_pending:
+                    names_chunk = chunks[next_chunk]
+                    pending.append((names_chunk, executor.submit(self.__get_services_batch, names_chunk)))
+                    next_chunk += 1
+
+                ## Results are consumed in submission order for deterministic output
+                names_chunk, future = pending.popleft()
+                try:
+                    batch_creds = future.result()
+                except Exception as e:
+                    logger.debug(f'Unexpected error pulling batch of Vault services: {e}')
+                    batch_creds = False
+
+                for svc in names_chunk:
+                    if batch_creds == False:
+                        yield svc, False
+                    else:
+                        yield svc, batch_creds.get(svc, {})
+
+
+
+    ## Deletes up to 10 services with a single delete_parameters call
+    ## Returns list of service names that failed to delete
+    def __delete_services_batch(self, names_chunk):
+        delete_res = self.aws_client.call(
+                        'ssm', 'delete_parameters',
+                        Names = [f'/{self.param_path}/{svc}' for svc in names_chunk]
+                    )
+
+        if not delete_res:
+            logger.debug('Failed to delete batch of Vault services')
+            return names_chunk
+
+        ## Invalid parameters no longer exist in Vault, nothing left to delete
+        if delete_res['InvalidParameters']:
+            logger.debug(f'Services already removed from Vault: {delete_res["InvalidParameters"]}')
+        return []
+
+
+
+    ## Deletes services from Vault without decrypting them, up to 10 names per delete_parameters call
+    ## Batches run concurrently by pool of max_workers
+    ## Returns list of service names that failed to delete
+    def delete_services(self, names):
+        names = list(dict.fromkeys(names))
+        chunks = [names[i:i+MAX_PARAMS_PER_GET] for i in range(0, len(names), MAX_PARAMS_PER_GET)]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self.__delete_services_batch, chunks))
+
+        failed_svcs = [svc for failed_chunk in results for svc in failed_chunk]
+        logger.debug(f'Deleted {len(names)-len(failed_svcs)}/{len(names)} services from Vault')
+        return failed_svcs
+
+
+
     ## Return True if service exists in Vault, False otherwise
+    ## Looks up service parameter directly instead of listing entire Vault
     def service_exists(self, service):
-        all_svcs = self.get_all_services()
-        if service in all_svcs:
+        if not service:
+            return False
+        if self.get_service_parameter(service, decrypt=False):
             return True
         return False
 
 
 
+    ## Context manager collecting HaccService mutations into a single unit of work
+    ## push_to_vault is deferred inside the batch, on exit each touched service is flushed
+    ##   with exactly one put_parameter/delete_parameter, independent services run concurrently
+    ## Nothing is written if the batch block raises
+    ## Services that failed to flush are left in failed_batch_services
+    @contextmanager
+    def batch(self):
+        self.batch_services = {}
+        self.failed_batch_services = []
+        try:
+            yield self
+            touched_services = list(self.batch_services.values())
+        finally:
+            self.batch_services = None
+
+        logger.debug(f'Flushing {len(touched_services)} services touched in batch')
+        self.failed_batch_services = self.flush_services(touched_services)
+
+
+    ## Registers service as touched in active batch
+    ## Returns HaccService obj already registered for service name,
+    ##   or None if no batch is active
+    def register_batch_service(self, svc_obj):
+        if self.batch_services == None:
+            return None
+        return self.batch_services.setdefault(svc_obj.service_name, svc_obj)
+
+
+    ## Pushes each service to Vault once, concurrently by pool of max_workers
+    ## Returns list of service names that failed to write
+    def flush_services(self, svc_objs):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(lambda svc_obj: svc_obj.push_to_vault(), svc_objs))
+        return [svc_obj.service_name for svc_obj, pushed in zip(svc_objs, results) if not pushed]
+
+
+
     ## Returns KMS ARN used to encrypt Vault credentials
     ## Returns False if failure to get key
     def get_kms_arn(self, kms_alias):
@@ -87,13 +423,20 @@ class Vault:
             return False
 
 
-    ## Returns a list of credentials read from a Vault backup output file
+    ## Returns generator reading credential records lazily from a Vault backup output file
+    ## Supports compressed container, streaming (NDJSON) and legacy single JSON backups
+    ## Optional service restricts records to a single service, containers only decompress its chunk
     ## If unable to parse, returns False
-    def parse_import_file(self, filename):
-        try:
-            f = open(filename, 'r')
-            creds_list = json.loads(f.read())['creds_list']
-            f.close()
-            return creds_list
-        except:
-            return False
+    def parse_import_file(self, filename, service=None):
+        services = {service} if service else None
+
+        if is_container_file(filename):
+            return read_container_records(filename, services)
+
+        if is_ndjson_file(filename):
+            return read_backup_records(filename, services)
+
+        if is_legacy_file(filename):
+            return read_legacy_records(filename, services)
+
+        return False
\ No newline at end of file
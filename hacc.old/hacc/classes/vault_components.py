@@ -1,4 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from logger.hacc_logger import logger
 from classes.aws_client import AwsClient
+from state.hacc_state import read_component_state, write_component_state
 
 
 ## VaultComponent Object:
@@ -6,7 +10,7 @@ from classes.aws_client import AwsClient
 ##
 ## Attributes:
 ##      aws_client, AwsClient object
-##      aws_account_id, string
+##      aws_account_id, string/None if identity check failed
 ##      cmk, ARN of HACC CMK/False
 ##      user, ARN of HACC user/False
 ##      scp, ARN of HACC SCP/False
@@ -15,26 +19,70 @@ from classes.aws_client import AwsClient
 ##      __cmk_exists
 ##      __user_exists
 ##      __scp_exists
+##      __load_cached
 ##      required
 ##      active
 ##
 class VaultComponents:
 
-    def __init__(self, config):
+    ## Optional use_cache reads components from local state file instead of AWS if fresh,
+    ##   a live check that finds all components is saved for next time
+    ## Install/eradicate always check live, only cached components have no aws_client
+    def __init__(self, config, use_cache=False):
+        if use_cache and self.__load_cached(config):
+            return
+
         ## Configure AWS clients based on whether SCP (multi-account) enabled
         self.aws_client = AwsClient(config, client_type='mgmt')
 
-        identity_info = self.aws_client.call('sts', 'get_caller_identity')
-        if identity_info:
-            self.aws_account_id = identity_info['Account']
-
-        self.scp = self.__scp_exists(config['aws_hacc_scp']) if config['create_scp'] else None
+        ## CMK and user lookups don't depend on anything, run them while identity/SCP are checked
+        ##   only the SCP lookup has to wait for the account ID
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            cmk_future = executor.submit(self.__cmk_exists, config['aws_hacc_kms_alias'])
+            user_future = executor.submit(self.__user_exists, config['aws_hacc_uname'])
+
+            self.aws_account_id = None
+            identity_info = self.aws_client.call('sts', 'get_caller_identity')
+            if identity_info:
+                self.aws_account_id = identity_info['Account']
+
+            self.scp = None
+            if config['create_scp']:
+                ## SCP lookup is by account, unknown if identity check failed
+                self.scp = self.__scp_exists(config['aws_hacc_scp']) if self.aws_account_id else False
+
+            self.cmk = cmk_future.result()
+            self.user = user_future.result()
+
+        ## Never cache a result missing the account ID, e.g. after a throttled identity check
+        if use_cache and self.aws_account_id and self.cmk and self.user and (self.scp or not config['create_scp']):
+            write_component_state(config, {
+                'aws_account_id': self.aws_account_id,
+                'cmk': self.cmk,
+                'user': self.user,
+                'scp': self.scp
+            })
+
+
+
+    ## Sets components from local state file
+    ## Returns False if no fresh cached state for config
+    def __load_cached(self, config):
+        cached = read_component_state(config)
+        if not cached:
+            return False
 
-        self.cmk = self.__cmk_exists(config['aws_hacc_kms_alias'])
-       # self.cmk = cmk if cmk else None
+        try:
+            self.aws_account_id = cached['aws_account_id']
+            self.cmk = cached['cmk']
+            self.user = cached['user']
+            self.scp = cached['scp']
+        except KeyError:
+            logger.debug('Cached Vault components incomplete, checking live')
+            return False
 
-        self.user = self.__user_exists(config['aws_hacc_uname'])
-      #  self.user = user if user else None
+        self.aws_client = None
+        return True
 
 
 
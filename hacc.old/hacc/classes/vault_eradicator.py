@@ -1,7 +1,6 @@
-import time
-
 from console.hacc_console import console
 from classes.vault_components import VaultComponents
+from waiters.hacc_waiters import wait_for_scp_detached
 
 from vault_install.hacc_credentials import delete_hacc_profile, get_hacc_access_key
 
@@ -19,6 +18,7 @@ from vault_install.hacc_credentials import delete_hacc_profile, get_hacc_access_
 ##      delete_iam_user_with_policy
 ##      __detach_org_policy
 ##      __delete_org_policy
+##      __scp_attached
 ##      delete_scp
 ##
 class VaultEradicator(VaultComponents):
@@ -162,6 +162,24 @@ class VaultEradicator(VaultComponents):
         return delete_scp_res
 
 
+    ## Returns True if provided SCP policy ID still attached to Vault account, False if not
+    ## Returns None if attached policies could not be listed
+    def __scp_attached(self, policy_id):
+        list_scp_kwargs = {'TargetId': self.aws_account_id, 'Filter': 'SERVICE_CONTROL_POLICY'}
+
+        while True:
+            vault_account_scp_obj = self.aws_client.call('org', 'list_policies_for_target', **list_scp_kwargs)
+            if not vault_account_scp_obj:
+                return None
+
+            if policy_id in [scp['Id'] for scp in vault_account_scp_obj['Policies']]:
+                return True
+
+            if 'NextToken' not in vault_account_scp_obj:
+                return False
+            list_scp_kwargs['NextToken'] = vault_account_scp_obj['NextToken']
+
+
     ## Returns True if delete successful or SCP doesn't exist and unsets scp attribute
     ## Returns False if failed to delete SCP
     def delete_scp(self):
@@ -187,8 +205,11 @@ class VaultEradicator(VaultComponents):
             self.scp = None
             return False
 
-        # Give SCP deletion time to take effect ('immediate' per AWS docs is not good enough :)
-        console.print('Successfully deleted SCP from Vault account, waiting 10 seconds to ensure completion')
+        ## SCP deletion is 'immediate' per AWS docs, poll until account no longer lists it
+        console.print('Successfully deleted SCP from Vault account, waiting for removal to take effect...')
+        if not wait_for_scp_detached(self.__scp_attached, self.scp):
+            console.print('[red]Timed out waiting for SCP removal to take effect')
+            return False
+
         self.scp = None
-        time.sleep(10)
         return True
\ No newline at end of file
@@ -1,81 +1,58 @@
 ## Code courtesy of David Sorkin, shared 2021
 
-import io
+import base64
 
 ## Cleverly map any binary data to set of 64 ASCII chars in a reversible manner
-def bin_to_ascii(data_bytes):
-    chars = "abcdefghijklmnopqrstuvwxyz"
-    chars += "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    chars += "0123456789"
-    chars += "/:"
-    char_list = [c for c in chars]
-
-    ## grabbing 6 bits at time, total len including padding at end should divide
-    padding = ((6 - len(data_bytes)) % 6) * b'X'
-
-    bc = 0
+## Data is left-padded with X bytes to a multiple of 6 bytes, then every 3 bytes b0 b1 b2 are read
+##   as little-endian int b0 | b1<<8 | b2<<16 and written as 4 chars, lowest 6 bits first
+## That is base64 with each 3-byte group and each 4-char group reversed, so decoding is done by
+##   slice assignment, base64 and a translation table instead of a per-char Python loop
+## Only the decoder is kept, for config files exported before authenticated streams
+##   (configure/hacc_stream_encryption.py), nothing writes this format anymore
+CODEC_CHARS = b'abcdefghijklmnopqrstuvwxyz' + b'ABCDEFGHIJKLMNOPQRSTUVWXYZ' + b'0123456789' + b'/:'
+BASE64_CHARS = b'ABCDEFGHIJKLMNOPQRSTUVWXYZ' + b'abcdefghijklmnopqrstuvwxyz' + b'0123456789' + b'+/'
+FROM_CODEC_TABLE = bytes.maketrans(CODEC_CHARS, BASE64_CHARS)
+CODEC_VALUES = {c: i for i, c in enumerate(CODEC_CHARS)}
+PAD_BYTE = b'X'
+
+
+## Returns copy of data with order reversed inside every group of group_len items
+## len(data) must be a multiple of group_len
+def reverse_groups(data, group_len):
+    out = bytearray(len(data))
+    for i in range(group_len):
+        out[i::group_len] = data[group_len-1-i::group_len]
+    return out
+
+
+## Decodes chars whose length is a multiple of 4
+def decode_groups(ascii_bytes):
+    base64_bytes = bytes(reverse_groups(ascii_bytes, 4)).translate(FROM_CODEC_TABLE)
+    return bytes(reverse_groups(base64.b64decode(base64_bytes, validate=True), 3))
+
+
+## Decodes trailing chars that don't fill a whole group, low bits first like a full group
+## Any bits that don't complete a byte are dropped
+def decode_partial_group(ascii_bytes):
     acc = 0
-    f = io.StringIO()
-
-    ## line up bytes of binary data
-    for b in padding + data_bytes:
-        acc |= b * 2 ** bc
-        bc += 8
-        ## grab 6 bits at a time and map to one of 64 chars
-        while bc >= 6:
-            f.write(char_list[acc & 63])
-            acc >>= 6
-            bc -= 6
-
-    return f.getvalue()
+    for i, c in enumerate(ascii_bytes):
+        acc |= CODEC_VALUES[c] << (6*i)
+    return acc.to_bytes(3, 'little')[:len(ascii_bytes)*6 // 8]
 
 
 ## Reverse mapping from ASCII chars to binary data
 def ascii_to_binary(ascii_in):
-    chars = "abcdefghijklmnopqrstuvwxyz"
-    chars += "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    chars += "0123456789"
-    chars += "/:"
-
-    char_dict = dict()
-
-    for i in range(len(chars)):
-        char_dict[chars[i]] = i
-
-    acc = 0
-    bc = 0
-    b_out = io.BytesIO()
-
-    ## 64 possible chars takes up 6 bits, line the bits out
-    for c in ascii_in:
-        ## bitwise OR assignment
-        acc |= char_dict[c] * 2 ** bc
-        bc += 6
-        ## grab 8 bits from the line and form a byte of binary
-        while bc >= 8:
-            b_out.write(bytes([acc & 255]))
-            acc >>= 8
-            bc -= 8
-
-    ret = b_out.getvalue()
+    ascii_bytes = ascii_in.encode() if isinstance(ascii_in, str) else bytes(ascii_in)
+    usable = len(ascii_bytes) - len(ascii_bytes) % 4
+    ret = decode_groups(ascii_bytes[:usable])
+    if usable < len(ascii_bytes):
+        ret += decode_partial_group(ascii_bytes[usable:])
 
     ## Strip off leading X's
-    p = 0
-    while ret[p] == ord(b"X"):
-        p += 1
-
-    return ret[p:]
+    return ret.lstrip(PAD_BYTE)
 
 
 ## XOR binary text with password
-def encrypt(clear_bytes, c_str):
-    cipher_bytes = bytearray(clear_bytes, 'utf-8')
-    for i in range(len(clear_bytes)):
-        cipher_bytes[i] ^= ord(c_str[i % len(c_str)])
-
-    return cipher_bytes
-
-
 def decrypt(cipher_bytes, c_str):
     clear_bytes = bytearray(cipher_bytes)
     for i in range(len(clear_bytes)):
@@ -85,14 +62,10 @@ def decrypt(cipher_bytes, c_str):
 
 
 
+## Legacy read path for config files exported before authenticated streams,
+##   new exports are written by configure/hacc_stream_encryption.py
 def decrypt_config_data(data, passwd):
     data = ascii_to_binary(data)
     data = decrypt(data, passwd)
     ## convert result to string
     return data.decode()
-
-
-def encrypt_config_data(data, passwd):
-    data = encrypt(data, passwd)
-    data = bin_to_ascii(data)
-    return data
\ No newline at end of file
@@ -0,0 +1,122 @@
+import os
+import hmac
+import struct
+import hashlib
+
+## Streaming authenticated encryption for exported configuration files, stdlib only:
+##   header | chunk | chunk | ... | final chunk
+## Header is magic, KDF iteration count, salt and nonce
+## Each chunk is a length word (top bit marks the final chunk), ciphertext and HMAC-SHA256 tag
+## Keys are derived once per file with PBKDF2, each chunk is XORed with a SHAKE-256 keystream
+##   unique to (key, nonce, chunk number) and authenticated with its number and final flag,
+##   so altered, reordered or truncated files fail at the first bad chunk
+STREAM_MAGIC = b'HACCENC\x01'
+HEADER_FORMAT = '>8sI16s16s'
+HEADER_LEN = struct.calcsize(HEADER_FORMAT)
+CHUNK_LEN_FORMAT = '>I'
+CHUNK_LEN_LEN = struct.calcsize(CHUNK_LEN_FORMAT)
+FINAL_CHUNK_FLAG = 0x80000000
+TAG_LEN = hashlib.sha256().digest_size
+CHUNK_SIZE = 64 * 1024
+KDF_ITERATIONS = 600000
+MAX_KDF_ITERATIONS = 10000000 ## Refuse absurd iteration counts from tampered headers
+
+
+## Derives (encryption key, MAC key) from password, done once per file
+def derive_keys(passwd, salt, iterations):
+    key_material = hashlib.pbkdf2_hmac('sha256', passwd.encode(), salt, iterations, dklen=64)
+    return key_material[:32], key_material[32:]
+
+
+## XORs chunk with keystream for chunk number in one bulk operation
+def xor_chunk(chunk, enc_key, nonce, chunk_num):
+    if not chunk:
+        return b''
+    keystream = hashlib.shake_256(enc_key + nonce + struct.pack('>Q', chunk_num)).digest(len(chunk))
+    return (int.from_bytes(chunk, 'big') ^ int.from_bytes(keystream, 'big')).to_bytes(len(chunk), 'big')
+
+
+## Returns tag binding ciphertext to its position in the file and whether it is the last chunk
+def chunk_tag(mac_key, nonce, chunk_num, final, ciphertext):
+    mac = hmac.new(mac_key, digestmod=hashlib.sha256)
+    mac.update(nonce + struct.pack('>Q?', chunk_num, final))
+    mac.update(ciphertext)
+    return mac.digest()
+
+
+## Returns True if binary file obj starts with stream encryption header, leaves file at start
+def is_encrypted_stream(f):
+    magic = f.read(len(STREAM_MAGIC))
+    f.seek(0)
+    return magic == STREAM_MAGIC
+
+
+## Encrypts iterable of plaintext byte chunks of any size into binary file obj
+## At most one CHUNK_SIZE chunk is held in memory
+def encrypt_stream(plain_chunks, out_f, passwd, iterations=KDF_ITERATIONS):
+    salt = os.urandom(16)
+    nonce = os.urandom(16)
+    enc_key, mac_key = derive_keys(passwd, salt, iterations)
+    out_f.write(struct.pack(HEADER_FORMAT, STREAM_MAGIC, iterations, salt, nonce))
+
+    def write_chunk(chunk, chunk_num, final):
+        ciphertext = xor_chunk(chunk, enc_key, nonce, chunk_num)
+        length_word = len(ciphertext) | (FINAL_CHUNK_FLAG if final else 0)
+        out_f.write(struct.pack(CHUNK_LEN_FORMAT, length_word))
+        out_f.write(ciphertext)
+        out_f.write(chunk_tag(mac_key, nonce, chunk_num, final, ciphertext))
+
+    ## Hold back one full chunk so the last one can be flagged final
+    pending = b''
+    chunk_num = 0
+    for plain in plain_chunks:
+        pending += plain
+        while len(pending) > CHUNK_SIZE:
+            write_chunk(pending[:CHUNK_SIZE], chunk_num, False)
+            pending = pending[CHUNK_SIZE:]
+            chunk_num += 1
+
+    write_chunk(pending, chunk_num, True)
+
+
+## Generator yielding verified plaintext byte chunks from binary file obj
+## Each chunk is authenticated before it is decrypted or yielded
+## Raises ValueError on wrong password, corrupted or truncated input
+def iter_decrypt_stream(in_f, passwd):
+    header = in_f.read(HEADER_LEN)
+    if len(header) != HEADER_LEN:
+        raise ValueError('Encrypted configuration header truncated')
+    magic, iterations, salt, nonce = struct.unpack(HEADER_FORMAT, header)
+    if magic != STREAM_MAGIC:
+        raise ValueError('Not an encrypted configuration stream')
+    if not 0 < iterations <= MAX_KDF_ITERATIONS:
+        raise ValueError('Invalid key derivation parameters')
+
+    enc_key, mac_key = derive_keys(passwd, salt, iterations)
+
+    chunk_num = 0
+    while True:
+        length_bytes = in_f.read(CHUNK_LEN_LEN)
+        if len(length_bytes) != CHUNK_LEN_LEN:
+            raise ValueError('Encrypted configuration truncated')
+
+        length_word = struct.unpack(CHUNK_LEN_FORMAT, length_bytes)[0]
+        final = bool(length_word & FINAL_CHUNK_FLAG)
+        chunk_len = length_word & ~FINAL_CHUNK_FLAG
+        if chunk_len > CHUNK_SIZE:
+            raise ValueError('Encrypted configuration chunk too large')
+
+        ciphertext = in_f.read(chunk_len)
+        tag = in_f.read(TAG_LEN)
+        if len(ciphertext) != chunk_len or len(tag) != TAG_LEN:
+            raise ValueError('Encrypted configuration truncated')
+        if not hmac.compare_digest(tag, chunk_tag(mac_key, nonce, chunk_num, final, ciphertext)):
+            raise ValueError('Wrong password or corrupted configuration file')
+
+        yield xor_chunk(ciphertext, enc_key, nonce, chunk_num)
+
+        if final:
+            if in_f.read(1):
+                raise ValueError('Unexpected data after end of encrypted configuration')
+            return
+        chunk_num += 1
@@ -1,4 +1,6 @@
 import sys
+import zlib
+from itertools import groupby, islice
 
 try:
     from rich.panel import Panel
@@ -8,9 +10,11 @@ except:
     sys.exit()
 
 from console.hacc_console import console
-from classes.vault import Vault
+from classes.vault import Vault, MAX_PARAMS_PER_GET
 from classes.hacc_service import HaccService
 
+PLAN_CHUNK_SERVICES = MAX_PARAMS_PER_GET * 10 ## Import services planned per round of Vault reads
+
 
 def add_credential_for_service(vault_obj, service_name, user, passwd):
     service_obj = HaccService(service_name, vault=vault_obj)
@@ -23,7 +27,10 @@ def add_credential_for_service(vault_obj, service_name, user, passwd):
         console.print(f'Username [yellow]{user} [white]already exists for service [steel_blue3]{service_name}.')
         return
 
-    service_obj.push_to_vault()
+    if not service_obj.push_to_vault():
+        console.print(f'[red]Failed to add [yellow]{user} [red]to [steel_blue3]{service_name}.')
+        return
+
     panel = Panel(
         f'Added [yellow]{user} [white]to [steel_blue3]{service_name}.',
         title='[green]Success',
@@ -34,20 +41,152 @@ def add_credential_for_service(vault_obj, service_name, user, passwd):
 
 
 
+## Generator yielding (service, {user:passwd}) for each run of import records with same service
+## Backups list each service's records together, so every service is grouped exactly once
+##   without holding the whole import in memory
+def group_import_records(creds_records):
+    for svc_name, svc_records in groupby(creds_records, key=lambda cred: cred['service']):
+        svc_creds = {}
+        for cred in svc_records:
+            svc_creds.setdefault(cred['username'], cred['password'])
+        yield svc_name, svc_creds
+
+
+## Computes minimal set of writes to import credential records against current Vault contents
+## Records are grouped by service and planned in chunks, only the services named in each
+##   chunk are read from Vault (10 per get_parameters call), memory grows with the planned
+##   writes instead of the whole Vault
+## Returns plan dict, False if Vault could not be read:
+##   writes, {service: (creds in Vault, Vault version, new creds to add)} for services needing new users
+##   num_import_svcs, number of service record groups read from import file, 0 if nothing to import
+##   num_new_svcs, num_new_creds, number of services/credentials to create
+##   num_existing, number of import records already present in Vault
+##   conflicts, list of (service, user) present in Vault with a different password
+def plan_import(vault, creds_records):
+    plan = {
+        'writes': {},
+        'num_import_svcs': 0,
+        'num_new_svcs': 0,
+        'num_new_creds': 0,
+        'num_existing': 0,
+        'conflicts': []
+    }
+
+    svc_groups = group_import_records(creds_records)
+    while True:
+        chunk = list(islice(svc_groups, PLAN_CHUNK_SERVICES))
+        if not chunk:
+            break
+
+        ## Services already planned for a write keep the Vault state they were read at
+        read_svcs = [svc_name for svc_name, _ in chunk if svc_name not in plan['writes']]
+        svc_objs = vault.get_services(read_svcs) if read_svcs else []
+        if svc_objs == False:
+            return False
+        vault_creds = {svc_obj.service_name: (svc_obj.credentials, svc_obj.version) for svc_obj in svc_objs}
+
+        for svc_name, svc_creds in chunk:
+            plan['num_import_svcs'] += 1
+            if svc_name in plan['writes']:
+                existing_creds, version, new_creds = plan['writes'][svc_name]
+            else:
+                existing_creds, version = vault_creds[svc_name]
+                new_creds = {}
+
+            for user, passwd in svc_creds.items():
+                if user in existing_creds:
+                    if existing_creds[user] == passwd:
+                        plan['num_existing'] += 1
+                    else:
+                        plan['conflicts'].append((svc_name, user))
+                elif user not in new_creds:
+                    new_creds[user] = passwd
+                    plan['num_new_creds'] += 1
+
+            if new_creds and svc_name not in plan['writes']:
+                plan['writes'][svc_name] = (existing_creds, version, new_creds)
+                if not existing_creds:
+                    plan['num_new_svcs'] += 1
+
+    return plan
+
+
+## Prints dry-run summary of import plan
+def print_import_plan(plan):
+    num_write_svcs = len(plan['writes'])
+    console.print('Import plan:')
+    console.print(f'  [green]{plan["num_new_svcs"]} [white]new services to create')
+    console.print(f'  [green]{plan["num_new_creds"]} [white]new credentials to add across {num_write_svcs} services')
+    console.print(f'  [green]{plan["num_existing"]} [white]credentials already in Vault, skipping')
+    console.print(f'  [green]{len(plan["conflicts"])} [white]conflicting credentials, keeping password in Vault')
+
+    for svc_name, user in plan['conflicts']:
+        console.print(f'    Username [yellow]{user} [white]already exists for service [steel_blue3]{svc_name} [white]with a different password.')
+
+
+## Issues only the writes required by import plan
+## Vault credentials already known so no reads needed, Vault batch flushes
+##   each planned service with one write, services written concurrently
+## Returns False if any service failed to import
+def apply_import_plan(vault, plan):
+    with vault.batch():
+        for svc_name, (existing_creds, version, new_creds) in plan['writes'].items():
+            svc_obj = HaccService(svc_name, vault=vault, credentials=dict(existing_creds), version=version)
+            for user, passwd in new_creds.items():
+                svc_obj.add_credential(user, passwd)
+
+    failed_svcs = set(vault.failed_batch_services)
+    for svc_name, (_, _, new_creds) in plan['writes'].items():
+        if svc_name in failed_svcs:
+            console.print(f'[red]Failed to import service [steel_blue3]{svc_name}')
+        else:
+            console.print(f'Added {len(new_creds)} credentials to [steel_blue3]{svc_name}.')
+
+    return not failed_svcs
+
+
+
 def add(args, config):
     vault = Vault(config)
 
     ## Import credentials from provided filename
     if args.file:
         console.print(f'Importing credentials from file [green]{args.file}...')
-        creds_list = vault.parse_import_file(args.file)
+        ## Optional service arg restores a single service from backup
+        creds_list = vault.parse_import_file(args.file, service=args.service)
 
         if not creds_list:
             console.print(f'Could not parse import file [green]{args.file}, [white]provide valid file name created by Vault backup')
             return
 
-        for cred in creds_list:
-            add_credential_for_service(vault, cred['service'], cred['username'], cred['password'])
+        ## Plan against current Vault contents, then only write services with new users
+        try:
+            plan = plan_import(vault, creds_list)
+            if plan == False:
+                console.print('[red]Failed to retrieve existing Vault services for import, exiting')
+                return
+
+            ## Records are read lazily, an empty or filtered-out file is only known once consumed
+            if not plan['num_import_svcs']:
+                if args.service:
+                    console.print(f'Service [steel_blue3]{args.service} [white]not found in import file [green]{args.file}')
+                else:
+                    console.print(f'Could not parse import file [green]{args.file}, [white]provide valid file name created by Vault backup')
+                return
+
+            print_import_plan(plan)
+            if args.dryrun:
+                console.print('Dry run complete, no changes made to Vault.')
+                return
+
+            if not apply_import_plan(vault, plan):
+                console.print('[red]Credential import incomplete, rerun import to retry failed services')
+                return
+
+        ## Malformed records are only found once reached in the file
+        except (ValueError, KeyError, OSError, zlib.error) as e:
+            console.print(f'[red]Could not parse remainder of import file [green]{args.file}, [white]import incomplete: {e}')
+            return
         console.print('Credential import complete.')
 
 
@@ -1,38 +1,195 @@
 import json
+import zlib
 
 from console.hacc_console import console
-from classes.hacc_service import HaccService
 from classes.vault import Vault
+from classes.aws_client import get_max_workers
+
+from backup_files.hacc_ndjson import is_ndjson_filename, read_header, get_checkpoint, open_backup_for_write, write_service_records, remove_checkpoint
+from backup_files.hacc_manifest import read_manifest, write_manifest, get_relative_base, service_changed
+from backup_files.hacc_container import is_container_filename, write_container
+
+
+## Generator yielding (service, credentials) in sorted service order
+## Services fetched concurrently by worker pool, failed services collected in failed_svcs
+## Raises RuntimeError if Vault services cannot be listed
+def get_vault_concurrently(vault, workers, failed_svcs):
+    all_svcs = vault.get_all_services()
+    if all_svcs == False:
+        raise RuntimeError('Failed to list Vault services')
+
+    console.print(f'Found {len(all_svcs)} services to back up with {workers} workers')
+    for svc, svc_creds in vault.iter_services_concurrently(sorted(all_svcs), workers):
+        if svc_creds == False:
+            failed_svcs.append(svc)
+            continue
+        ## Service removed from Vault since listing
+        if not svc_creds:
+            continue
+        yield svc, svc_creds
+
+
+
+## Streams Vault contents to backup file one record per line as each service is fetched
+## Checkpoints after every service so an interrupted backup resumes where it stopped
+## Services are processed in sorted order, memory use doesn't grow with Vault size
+## Incremental backups only fetch services changed since base backup manifest
+## Manifest lists the version each service was written at, or its base manifest entry if it
+##   is only in the base chain, so it describes the backup chain rather than the Vault at the end of the run
+def stream_backup(vault, filename, workers, base_filename=None):
+    ## Service versions come from metadata only, nothing decrypted yet
+    svc_versions = vault.get_service_versions()
+    if svc_versions == False:
+        console.print('[red]Failed to list Vault service versions, [white]check HACC can read the Vault parameter path')
+        return
+
+    base = None
+    base_svcs = {}
+    svcs_to_backup = sorted(svc_versions)
+    if base_filename:
+        base_manifest = read_manifest(base_filename)
+        if not base_manifest:
+            console.print(f'[red]Could not read manifest for base backup {base_filename}, [white]incremental backup requires a previous .ndjson backup')
+            return
+
+        base = get_relative_base(filename, base_filename)
+        base_svcs = base_manifest['services']
+        svcs_to_backup = [svc for svc in svcs_to_backup if service_changed(svc, svc_versions[svc], base_manifest)]
+        console.print(f'{len(svc_versions)-len(svcs_to_backup)} services unchanged since [green]{base_filename}')
+
+    ## A resumed backup must chain to the same base it was started with
+    if get_checkpoint(filename):
+        resume_base = (read_header(filename) or {}).get('base')
+        if resume_base != base:
+            console.print(f'[red]Interrupted backup {filename} was started with a different incremental base, [white]rerun with the same base or use a new backup file name')
+            return
+
+    try:
+        f, versions_f, last_svc, written_versions = open_backup_for_write(filename, base=base)
+    except:
+        console.print('[red]Failed to open backup file for writing, exiting')
+        return
+
+    if last_svc:
+        console.print(f'Resuming interrupted backup after service [steel_blue3]{last_svc}')
+        ## Services at or before the checkpoint aren't fetched again, manifest keeps the version
+        ##   they were written at (or their base entry) so the next incremental backup picks them up
+        num_missed = len([svc for svc in svcs_to_backup if svc <= last_svc and written_versions.get(svc) != svc_versions[svc]])
+        if num_missed:
+            console.print(f'{num_missed} services changed before resume point, [white]next incremental backup will include them')
+    svcs_to_backup = [svc for svc in svcs_to_backup if last_svc == None or svc > last_svc]
+    console.print(f'Found {len(svcs_to_backup)} services to back up')
+
+    num_svcs = 0
+    with f, versions_f:
+        for svc, svc_creds in vault.iter_services_concurrently(svcs_to_backup, workers):
+            ## Stop at first failure so rerunning resumes from this service
+            if svc_creds == False:
+                console.print(f'[red]Failed to retrieve service {svc}, [white]rerun backup to resume from last completed service')
+                return
+
+            ## Service removed from Vault since listing
+            if not svc_creds:
+                continue
+
+            console.print(f'Backing up service {svc}')
+            try:
+                ## Listed version is never newer than the credentials fetched after it,
+                ##   a write in between only makes the next incremental backup fetch it again
+                write_service_records(f, versions_f, filename, svc, svc_creds, svc_versions[svc])
+            except:
+                console.print('[red]Failed to write Vault data to backup file, [white]rerun backup to resume from last completed service')
+                return
+            written_versions[svc] = svc_versions[svc]
+            num_svcs += 1
+
+    ## Manifest lets the next incremental backup skip unchanged services
+    ## Services still in Vault but not written here are restored from the base chain at its version
+    manifest_versions = {svc: base_svcs[svc] for svc in svc_versions if svc in base_svcs}
+    manifest_versions.update(written_versions)
+    ## Checkpoint and version log are kept until the manifest exists, rerunning rewrites it
+    try:
+        write_manifest(filename, manifest_versions, base=base)
+    except:
+        console.print('[red]Failed to write backup manifest, [white]rerun backup to retry before using it as base for incremental backups')
+        return
+
+    remove_checkpoint(filename)
+    console.print(f'Backed up {num_svcs} services')
+    console.print(f'Successfully created Vault backup file: {filename}')
+    return
+
 
 
 ## Creates new backup file with entire Vault contents
 def backup(args, config):
     console.print('Backing up Vault data...')
     vault = Vault(config)
+    workers = get_max_workers(config)
 
-    all_svcs = vault.get_all_services()
-    # If no services in vault, can't look anything up
-    if not all_svcs:
-        console.print('No credentials in vault, nothing to backup.')
+    ## Streaming format selected by .ndjson/.jsonl file extension
+    if is_ndjson_filename(args.file):
+        stream_backup(vault, args.file, workers, base_filename=args.incremental)
+        return
+
+    if args.incremental:
+        console.print('Incremental backups require a streaming backup file, use a [green].ndjson [white]file name')
         return
 
-    num_svcs = len(all_svcs)
-    console.print(f'Found {num_svcs} services with credentials to back up')
+    ## Parallel backup mode when multiple workers configured
+    ## Otherwise stream decrypted services from a single paged sweep of the Vault
+    failed_svcs = []
+    if workers > 1:
+        all_svc_creds = get_vault_concurrently(vault, workers, failed_svcs)
+    else:
+        all_svc_creds = vault.snapshot()
 
+    ## Compressed, indexed container selected by .hacz file extension
+    if is_container_filename(args.file):
+        try:
+            num_svcs = write_container(args.file, all_svc_creds)
+        except RuntimeError as e:
+            console.print(f'[red]{e}, [white]no backup file written')
+            return
+        except (OSError, ValueError, zlib.error) as e:
+            console.print(f'[red]Failed to write Vault data to backup file, exiting: {e}')
+            return
+
+        if failed_svcs:
+            console.print(f'[red]Failed to retrieve {len(failed_svcs)} services, not included in backup: [white]{", ".join(failed_svcs)}')
+        console.print(f'Backed up {num_svcs} services')
+        console.print(f'Successfully created Vault backup file: {args.file}')
+        return
+
+    num_svcs = 0
     creds_list = []
-    for svc in all_svcs:
-        console.print(f'Backing up service {svc}')
-
-        svc_obj = HaccService(svc, vault=vault)
-        for cred in svc_obj.credentials:
-            creds_list.append(
-                {
-                    'service': svc, 
-                    'username': cred, 
-                    'password': svc_obj.credentials[cred]
-                }
-            )
+    try:
+        for svc, svc_creds in all_svc_creds:
+            console.print(f'Backing up service {svc}')
+            num_svcs += 1
+
+            for cred in svc_creds:
+                creds_list.append(
+                    {
+                        'service': svc, 
+                        'username': cred, 
+                        'password': svc_creds[cred]
+                    }
+                )
+    except RuntimeError as e:
+        console.print(f'[red]{e}, [white]no backup file written')
+        return
+
+    ## Tolerate partial failures, back up what we could and report the rest
+    if failed_svcs:
+        console.print(f'[red]Failed to retrieve {len(failed_svcs)} services, not included in backup: [white]{", ".join(failed_svcs)}')
+
+    # If no services in vault, nothing to write
+    if not num_svcs:
+        console.print('No credentials in vault, nothing to backup.')
+        return
 
+    console.print(f'Retrieved {num_svcs} services with credentials to back up')
     backup_content = {'creds_list': creds_list}
 
     try:
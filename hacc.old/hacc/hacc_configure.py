@@ -12,15 +12,20 @@ except:
 from console.hacc_console import console
 
 from vault_install.hacc_credentials import get_hacc_access_key, get_hacc_secret_key, set_hacc_access_key, set_hacc_secret_key
-from configure.hacc_encryption import encrypt_config_data, decrypt_config_data
-from hacc_generate import generate_password
+from configure.hacc_encryption import decrypt_config_data
+from configure.hacc_stream_encryption import encrypt_stream, iter_decrypt_stream, is_encrypted_stream
 
 
-def get_all_configuration(config):
+## Adds Vault user credentials to config dict
+def add_credentials_to_config(config):
     profile_name = config['aws_hacc_uname']
     config['aws_access_key_id'] = get_hacc_access_key(profile_name)
     config['aws_secret_access_key'] = get_hacc_secret_key(profile_name)
-    return json.dumps(config, indent=4, sort_keys=True)
+    return config
+
+
+def get_all_configuration(config):
+    return json.dumps(add_credentials_to_config(config), indent=4, sort_keys=True)
 
 
 def get_configuration(val, config):
@@ -117,18 +122,24 @@ def get_set_type(inpt, f_name):
 
 
 
+## Reads encrypted configuration file, streamed format is verified chunk by chunk
+## Files exported before streamed encryption are still read with the legacy decoder
 def import_configuration_file(f_name, passwd):
-    ## Read encrypted file
     try:
-        with open(f_name, 'r') as f:
-            enc_config = f.read()
+        f = open(f_name, 'rb')
     except:
         console.print(f'[red]Could not open file {f_name}.')
         return
 
-    ## Decrypt file
-    config = decrypt_config_data(enc_config, passwd)
     try:
+        with f:
+            if is_encrypted_stream(f):
+                ## Config files are a few KB of settings and credentials, plaintext is joined and
+                ##   parsed in memory once every chunk has been authenticated
+                config = b''.join(iter_decrypt_stream(f, passwd)).decode()
+            else:
+                ## Legacy read path, files exported before authenticated streams
+                config = decrypt_config_data(f.read().decode(), passwd)
         config = json.loads(config)
         return config
     except:
@@ -140,20 +151,19 @@ def import_configuration_file(f_name, passwd):
 def export_configuration(f_name, config, generate_passwd=True):
     console.print(f'Exporting current HACC configuration as file {f_name}...')
 
-    config_str = get_all_configuration(config)
+    config = add_credentials_to_config(config)
     if generate_passwd:
+        from hacc_generate import generate_password
         passwd = generate_password()
     else:
         passwd = input('Enter password to encrypt configuration data file: ')
 
-    enc_config = encrypt_config_data(config_str, passwd)
-    if not enc_config:
-        console.print('[red]Could not encrypt configuration data.')
-        return
+    ## Config is serialized and encrypted piece by piece, never held as one string
+    config_chunks = (s.encode() for s in json.JSONEncoder(indent=4, sort_keys=True).iterencode(config))
 
     try:
-        with open(f_name, 'w') as f:
-            f.write(enc_config)
+        with open(f_name, 'wb') as f:
+            encrypt_stream(config_chunks, f, passwd)
         console.print(f'Created encrypted file {f_name} in {os.getcwd()}.')
 
         if generate_passwd:
@@ -1,10 +1,7 @@
 import os
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 from console.hacc_console import console
-from classes.vault_components import VaultComponents
-
-from versions.hacc_versions import check_for_upgrades, check_for_old_versions, cleanup_old_versions
 
 
 
@@ -34,6 +31,8 @@ REQUIRED_COMMON_VARS = [
     'cleanup_old_versions'
 ]
 
+STARTUP_WORKERS = 1 ## old version cleanup runs alongside config/component checks
+
 
 ## Function to read config parameters from hacc_vars file into object
 def get_config_params():
@@ -108,12 +107,21 @@ def required_config_set_for_action(args, config):
 
 
 ## Function to confirm all required Vault components for action are setup
+## AWS client only loaded for actions that check Vault components
 def vault_components_exist_for_action(progress, args, config):
+    if args.action not in DATA_ACTIONS and not (args.action == 'eradicate' and args.wipe):
+        return True
+    from classes.vault_components import VaultComponents
+
     if args.action in DATA_ACTIONS:
-        components = VaultComponents(config)
+        components = VaultComponents(config, use_cache=True)
         active = components.active()
         required = components.required()
 
+        ## Vault reuses key ARN instead of describing key again
+        if components.cmk:
+            config['aws_hacc_kms_arn'] = components.cmk
+
         if len(active) == 0:
             progress.console.print('No Vault detected, execute [salmon1]hacc --install [white]or [salmon1]hacc --configure [white]before attempting this command.')
             return False
@@ -137,54 +145,86 @@ def vault_components_exist_for_action(progress, args, config):
 
 
 
-## Initialization function for HACC client
-## 1. Loads config variables from configuration file
-## 2. Confirms all required variables for action exist
-## 3. Checks for software upgrades (if check_for_upgrades == True)
-## 4. Cleans up old software versions (if cleanup_old_versions == True)
-## 5. Confirms all required Vault components properly setup for action
+## Removes previous HACC installations found on system
+def remove_old_versions(current_version):
+    from versions.hacc_versions import check_for_old_versions, cleanup_old_versions
+
+    old_versions = check_for_old_versions(current_version)
+    if old_versions:
+        console.print(f'Found previous versions: {old_versions}')
+        cleanup_old_versions(old_versions)
+
+
+
+## Initialization function for HACC client, run as a dependency graph:
+## 1. Loads config variables from configuration file, every other step needs it
+## 2. Checks cached tags for software upgrades (if check_for_upgrades == True),
+##      refreshing a stale cache in background
+## 3. Concurrently, once config loaded:
+##      - Cleans up old software versions (if cleanup_old_versions == True)
+##      - Confirms all required variables for action exist, then
+##        confirms all required Vault components properly setup for action
+## Each progress task completes when its step actually finishes
 ##
 ## Returns configuration variable dict required by client, None if error
 def startup(progress, args, current_version):
     ## Get all saved config vars from config file
     get_config_task = progress.add_task("[steel_blue3]Retrieving client configuration...", total=1)
     config = get_config_params()
-    progress.update(get_config_task, advance=1)
-    time.sleep(0.1)
-
-    ## Check for upgrades automatically if indicated in config file
-    if config['check_for_upgrades']:
-        upgrade_task = progress.add_task("[steel_blue3]Checking for available HACC upgrades...", total=1)
-        new_version = check_for_upgrades(current_version)
-        if new_version:
-            console.print(f'New HACC version {new_version} available for installation. Upgrade with hacc --upgrade')
-        progress.update(upgrade_task, advance=1)
-        time.sleep(0.1)
-
-    ## Cleanup previous HACC installations automatically if indicated in config file
-    if config['cleanup_old_versions']:
-        cleanup_task = progress.add_task("[steel_blue3]Cleaning up all previous HACC installations...", total=1)
-        old_versions = check_for_old_versions(current_version)
-        if old_versions:
-            console.print(f'Found previous versions: {old_versions}')
-            cleanup_old_versions(old_versions)
-        progress.update(cleanup_task, advance=1)
-        time.sleep(0.1)
-
-    ## Ensure all required config vars for action exist
-    required_config_task = progress.add_task("[steel_blue3]Confirming client config is valid for action...", total=1)
-    if not required_config_set_for_action(args, config):
+    if not config:
         progress.stop()
         return None
-    progress.update(required_config_task, advance=1)
-    time.sleep(0.1)
+    progress.update(get_config_task, advance=1)
 
-    ## Ensure Vault is setup correctly for action
-    vault_task = progress.add_task("[steel_blue3]Confirming vault components are setup for action...", total=1)
-    if not vault_components_exist_for_action(progress, args, config):
-        return None
-    progress.update(vault_task, advance=1)
-    time.sleep(0.1)
+    executor = ThreadPoolExecutor(max_workers=STARTUP_WORKERS)
+    try:
+        ## Check for upgrades automatically if indicated in config file
+        ## Answered from cached tags, a stale cache is refreshed in background and reported by report_upgrade_check
+        if config['check_for_upgrades']:
+            from versions.hacc_versions import start_upgrade_check
+            new_version = start_upgrade_check(current_version)
+            if new_version:
+                console.print(f'New HACC version {new_version} available for installation. Upgrade with hacc --upgrade')
+
+        ## Cleanup previous HACC installations automatically if indicated in config file
+        cleanup_future = None
+        if config['cleanup_old_versions']:
+            cleanup_task = progress.add_task("[steel_blue3]Cleaning up all previous HACC installations...", total=1)
+            cleanup_future = executor.submit(remove_old_versions, current_version)
+            cleanup_future.add_done_callback(lambda _: progress.update(cleanup_task, advance=1))
+
+        ## Ensure all required config vars for action exist
+        required_config_task = progress.add_task("[steel_blue3]Confirming client config is valid for action...", total=1)
+        if not required_config_set_for_action(args, config):
+            progress.stop()
+            return None
+        progress.update(required_config_task, advance=1)
+
+        ## Ensure Vault is setup correctly for action
+        vault_task = progress.add_task("[steel_blue3]Confirming vault components are setup for action...", total=1)
+        if not vault_components_exist_for_action(progress, args, config):
+            return None
+        progress.update(vault_task, advance=1)
+
+        if cleanup_future:
+            cleanup_future.result()
+
+    finally:
+        ## Don't hold up failed startup for background steps
+        executor.shutdown(wait=False)
 
     config['version'] = current_version
-    return config
\ No newline at end of file
+    return config
+
+
+
+## Reports newer HACC version found by background upgrade check once action finished
+## Nothing printed if refresh still running or version already reported at startup
+def report_upgrade_check(config):
+    if not config['check_for_upgrades']:
+        return
+    from versions.hacc_versions import finish_upgrade_check
+
+    new_version = finish_upgrade_check(config['version'])
+    if new_version:
+        console.print(f'New HACC version {new_version} available for installation. Upgrade with hacc --upgrade')
@@ -12,17 +12,21 @@ from classes.hacc_service import HaccService
 from classes.vault import Vault
 
 
+## Removes every service from Vault by name, nothing is decrypted
 def delete_all_creds(config):
     vault = Vault(config)
 
-    for svc_name in vault.get_all_services():
-        svc_obj = HaccService(svc_name, vault=vault)
+    ## Names listed without decryption, service values never pulled
+    all_svcs = vault.get_all_services()
+    if all_svcs == False:
+        console.print('[red]Failed to list Vault services, exiting')
+        return
 
-        for user in svc_obj.get_users():
-            svc_obj.remove_credential(user)
+    failed_svcs = vault.delete_services(all_svcs)
+    console.print(f'All credentials for [green]{len(all_svcs)-len(failed_svcs)} [white]services have been deleted')
 
-        svc_obj.push_to_vault()
-        console.print(f'All credentials for service [steel_blue3]{svc_name} [white]have been deleted')
+    if failed_svcs:
+        console.print(f'[red]Failed to delete {len(failed_svcs)} services: [white]{", ".join(failed_svcs)}')
     return
 
 
@@ -44,7 +48,10 @@ def delete(args, config):
         console.print(f'Username [yellow]{user} [white]does not exist for service [steel_blue3]{service_name}, [white]exiting.')
         return
 
-    svc_obj.push_to_vault()
+    if not svc_obj.push_to_vault():
+        console.print(f'[red]Failed to delete [yellow]{user} [red]from [steel_blue3]{service_name}.')
+        return
+
     panel = Panel(
         f'Deleted [yellow]{user} [white]from [steel_blue3]{service_name}.',
         title='[green]Success',
@@ -1,4 +1,3 @@
-import time
 import sys
 
 try:
@@ -10,8 +9,10 @@ except:
     sys.exit()
 
 from console.hacc_console import console
+from state.hacc_state import invalidate_component_state
 from classes.vault import Vault
 from classes.vault_eradicator import VaultEradicator
+from waiters.hacc_waiters import wait_for_vault_empty
 
 from hacc_delete import delete
 
@@ -30,13 +31,14 @@ def eradicate(args, config):
         console.print('Aborting, close one ;)')
         return
 
+    invalidate_component_state()
+
     ## Wipe all credentials before Vault deletion
     if args.wipe:
         vault = Vault(config)
         delete(args, config)
-        time.sleep(5)
 
-        if len(vault.get_all_services()) != 0:
+        if not wait_for_vault_empty(vault):
             console.print('[red]Failed to delete all credentials from Vault, aborting eradication')
             return
 
@@ -1,9 +1,12 @@
-import secrets ## random library unsuitable to cryptographic purposes
+import os ## os.urandom is the CSPRNG behind secrets, random library unsuitable to cryptographic purposes
+import math
 
-import wordlist
+from hacc_wordlist import load_wordlist
 
 MAX_CHAR_SWAPS = 5 ## Max number of character substitions to make in password
 NUM_WORDS_IN_PASS = 4 ## XKCD-style passwords
+RANDOM_BUFFER_SIZE = 4096 ## Bytes drawn from OS per refill when generating batches
+SINGLE_PASSWORD_BUFFER_SIZE = 32 ## Enough for one password without wasting entropy
 
 DIGIT_CHAR_MAP = {
     'b': '6',
@@ -19,26 +22,81 @@ SPECIAL_CHAR_MAP = {
     's': '$'
 }
 
+## Word features for constrained generation: (has digit-only char, has special-only char, shared chars up to 2)
+## Chars in both maps (i) can take either kind of substitution but not both
+SHARED_SUB_CHARS = set(DIGIT_CHAR_MAP) & set(SPECIAL_CHAR_MAP)
+NO_SUB_FEATURES = (0, 0, 0)
+
+word_index = None
+policy_counts = {}
+
+
+## RandomBuffer Object:
+##      Draws bytes from the OS CSPRNG in bulk and hands out unbiased random integers
+##      One os.urandom call serves many draws instead of one call per random number
+##
+## Attributes:
+##      buffer_size, int bytes drawn per refill
+##      buf, bytes
+##      pos, int next unused byte in buf
+##
+## Methods:
+##      __take_bytes
+##      randbelow
+##
+class RandomBuffer:
+
+    ## Returns next num_bytes random bytes, refilling buffer if needed
+    def __take_bytes(self, num_bytes):
+        if self.pos + num_bytes > len(self.buf):
+            self.buf = self.buf[self.pos:] + os.urandom(max(self.buffer_size, num_bytes))
+            self.pos = 0
+        chunk = self.buf[self.pos:self.pos+num_bytes]
+        self.pos += num_bytes
+        return chunk
+
+
+    ## Returns random int in [0, n) like secrets.randbelow
+    ## Rejection sampling on the smallest covering bit mask keeps every value equally likely,
+    ##   at least half of all draws are accepted
+    def randbelow(self, n):
+        if n <= 0:
+            raise ValueError('Upper bound must be positive')
+        if n == 1:
+            return 0
+
+        num_bits = (n-1).bit_length()
+        num_bytes = (num_bits + 7) // 8
+        mask = (1 << num_bits) - 1
+        while True:
+            value = int.from_bytes(self.__take_bytes(num_bytes), 'big') & mask
+            if value < n:
+                return value
+
+
+    def __init__(self, buffer_size=RANDOM_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.buf = b''
+        self.pos = 0
+
+
 
 ## Perform random character substitions in given password
-def sub_chars(password, char_map, num_subs):
+## Substitutable positions are found up front and sampled without replacement,
+##   same distribution as probing random chars until a substitutable one is hit
+def sub_chars(password, char_map, num_subs, rand=None):
+    rand = rand or RandomBuffer(SINGLE_PASSWORD_BUFFER_SIZE)
     pass_chars = list(password)
-    num_pass_chars = len(pass_chars)
-
-    subs_made = 0
-    max_attempts = 10000
-    num_attempts = 0
-    ## if we can't find a char to sub after 10000 attempts, give up
-    while subs_made < num_subs and num_attempts < max_attempts:
-        
-        ## choose random char in password
-        random_int = secrets.randbelow(num_pass_chars)
-        random_char = pass_chars[random_int]
-        if random_char in char_map:
-            pass_chars[random_int] = char_map[random_char]
-            subs_made += 1
-
-        num_attempts += 1
+
+    eligible_positions = [i for i, c in enumerate(pass_chars) if c in char_map]
+    subs_made = min(num_subs, len(eligible_positions))
+
+    ## Partial Fisher-Yates shuffle picks subs_made distinct positions
+    for i in range(subs_made):
+        j = i + rand.randbelow(len(eligible_positions) - i)
+        eligible_positions[i], eligible_positions[j] = eligible_positions[j], eligible_positions[i]
+        pos = eligible_positions[i]
+        pass_chars[pos] = char_map[pass_chars[pos]]
 
     new_pass = ''.join(pass_chars)
     return {
@@ -50,14 +108,17 @@ def sub_chars(password, char_map, num_subs):
 
 ## Quick function to generate XKCD-style password,
 ##  4 random words joined with some char subs
-def generate_password():
+## Optional rand RandomBuffer lets batches share bulk randomness
+def generate_password(rand=None):
+    rand = rand or RandomBuffer(SINGLE_PASSWORD_BUFFER_SIZE)
     pass_words = []
-    wordlist_len = len(wordlist.wordlist)
+    words = load_wordlist()
+    wordlist_len = len(words)
 
     for _ in range(NUM_WORDS_IN_PASS):
         ## get random line number for wordlist
-        line_num = secrets.randbelow(wordlist_len)
-        pass_words.append(wordlist.wordlist[line_num])
+        line_num = rand.randbelow(wordlist_len)
+        pass_words.append(words[line_num])
 
     ## CamelCase words
     pass_words = [x[0].upper()+x[1:] for x in pass_words]
@@ -65,16 +126,211 @@ def generate_password():
     password = ''.join(pass_words)
 
     ## Sub random number of letters with special chars / digits
-    num_char_swaps = secrets.randbelow(MAX_CHAR_SWAPS+1)
-    num_digit_swaps = secrets.randbelow(num_char_swaps+1)
+    num_char_swaps = rand.randbelow(MAX_CHAR_SWAPS+1)
+    num_digit_swaps = rand.randbelow(num_char_swaps+1)
     num_special_swaps = num_char_swaps - num_digit_swaps
 
-    sub_obj = sub_chars(password, DIGIT_CHAR_MAP, num_digit_swaps)
+    sub_obj = sub_chars(password, DIGIT_CHAR_MAP, num_digit_swaps, rand)
     ## If not enough digit subs available, try to make extra special subs
     if sub_obj['subs_made'] < num_digit_swaps:
         num_special_swaps += num_digit_swaps - sub_obj['subs_made']
 
     ## If not enough special subs available, oh well
-    password = sub_chars(sub_obj['password'], SPECIAL_CHAR_MAP, num_special_swaps)['password']
+    password = sub_chars(sub_obj['password'], SPECIAL_CHAR_MAP, num_special_swaps, rand)['password']
+
+    return password
+
+
+
+## Generates num_passwords passwords at once, e.g. when provisioning many accounts
+## Randomness is drawn from the OS in RANDOM_BUFFER_SIZE blocks shared by the whole batch
+## Returns list of passwords
+def generate_passwords(num_passwords):
+    rand = RandomBuffer()
+    return [generate_password(rand) for _ in range(num_passwords)]
+
+
+
+## Returns substitution feature tuple for word as it appears in password (first letter capitalized)
+def get_word_features(word):
+    sub_chars_in_word = word[1:]
+    num_digit = len([c for c in sub_chars_in_word if c in DIGIT_CHAR_MAP and c not in SHARED_SUB_CHARS])
+    num_special = len([c for c in sub_chars_in_word if c in SPECIAL_CHAR_MAP and c not in SHARED_SUB_CHARS])
+    num_shared = len([c for c in sub_chars_in_word if c in SHARED_SUB_CHARS])
+    return (min(num_digit, 1), min(num_special, 1), min(num_shared, 2))
+
+
+## Combines feature tuples of two runs of words, capped like get_word_features
+def combine_features(a, b):
+    return (min(a[0]+b[0], 1), min(a[1]+b[1], 1), min(a[2]+b[2], 2))
+
+
+## Returns True if password with given features can take every required substitution
+##   on distinct chars
+def features_satisfy(features, require_digit, require_special):
+    num_digit, num_special, num_shared = features
+    if require_digit and require_special:
+        return (num_digit and num_special + num_shared) or (num_special and num_digit + num_shared) or num_shared >= 2
+    if require_digit:
+        return bool(num_digit or num_shared)
+    if require_special:
+        return bool(num_special or num_shared)
+    return True
+
+
+## Returns index of wordlist positions bucketed by (word length, substitution features)
+## Built once per process
+def get_word_index():
+    global word_index
+    if word_index == None:
+        word_index = {}
+        for i, word in enumerate(load_wordlist()):
+            word_index.setdefault((len(word), get_word_features(word)), []).append(i)
+    return word_index
+
+
+## Counts ordered word sequences for password policy, cached per policy
+## counts[k] maps total length to {features: number of k-word sequences}, later words only
+##   extend a sequence if it can still fit in max_length
+## Returns counts list
+def get_policy_counts(min_length, max_length, require_digit, require_special):
+    policy = (min_length, max_length, require_digit, require_special)
+    if policy in policy_counts:
+        return policy_counts[policy]
+
+    buckets = get_word_index()
+    counts = [{0: {NO_SUB_FEATURES: 1}}]
+    for _ in range(NUM_WORDS_IN_PASS):
+        next_counts = {}
+        for total_len, features_counts in counts[-1].items():
+            for (word_len, word_features), word_nums in buckets.items():
+                if max_length != None and total_len + word_len > max_length:
+                    continue
+                len_counts = next_counts.setdefault(total_len + word_len, {})
+                for features, num_seqs in features_counts.items():
+                    combined = combine_features(features, word_features)
+                    len_counts[combined] = len_counts.get(combined, 0) + num_seqs * len(word_nums)
+        counts.append(next_counts)
 
-    return password
\ No newline at end of file
+    ## Final step only keeps passwords meeting every constraint, flattened to (length, features)
+    counts[-1] = {
+        (total_len, features): num_seqs
+        for total_len, features_counts in counts[-1].items()
+        for features, num_seqs in features_counts.items()
+        if total_len >= min_length and features_satisfy(features, require_digit, require_special)
+    }
+    policy_counts[policy] = counts
+    return counts
+
+
+## Returns exact entropy in bits of word selection under policy, False if policy unsatisfiable
+## Every valid word sequence is equally likely, substitutions only add to this
+def get_policy_entropy(min_length=0, max_length=None, require_digit=False, require_special=False):
+    num_passwords = sum(get_policy_counts(min_length, max_length, require_digit, require_special)[-1].values())
+    if not num_passwords:
+        return False
+    return math.log2(num_passwords)
+
+
+## Returns generated password policy from config as kwargs for generate_constrained_password
+## Config lengths are strings, 0/unset/invalid means no limit, booleans are parsed by config loader
+## Returns None if config sets no constraints, plain generate_password applies
+def get_password_policy(config):
+    policy = {}
+    for key, param in [('min_length', 'password_min_length'), ('max_length', 'password_max_length')]:
+        try:
+            length = int(config.get(param, 0))
+        except (TypeError, ValueError):
+            length = 0
+        if length > 0:
+            policy[key] = length
+
+    for key, param in [('require_digit', 'password_require_digit'), ('require_special', 'password_require_special')]:
+        if config.get(param) == True:
+            policy[key] = True
+
+    return policy or None
+
+
+## Returns item from dict of item:weight, chosen with probability proportional to its weight
+def weighted_choice(weights, rand):
+    choice = rand.randbelow(sum(weights.values()))
+    for item, weight in weights.items():
+        if choice < weight:
+            return item
+        choice -= weight
+
+
+## Makes one substitution from each required map on distinct substitutable chars
+## Fixed number of draws: digit position first, from positions that leave a special position free,
+##   then special position from the remaining special positions
+## Caller guarantees password features satisfy requirements
+def sub_required_chars(pass_chars, require_digit, require_special, rand):
+    digit_positions = [i for i, c in enumerate(pass_chars) if c in DIGIT_CHAR_MAP]
+    special_positions = [i for i, c in enumerate(pass_chars) if c in SPECIAL_CHAR_MAP]
+
+    digit_pos = None
+    if require_digit:
+        ## A lone special position must be kept for the special substitution
+        if require_special and len(special_positions) == 1:
+            digit_positions = [i for i in digit_positions if i != special_positions[0]]
+        digit_pos = digit_positions[rand.randbelow(len(digit_positions))]
+        pass_chars[digit_pos] = DIGIT_CHAR_MAP[pass_chars[digit_pos]]
+
+    if require_special:
+        special_positions = [i for i in special_positions if i != digit_pos]
+        special_pos = special_positions[rand.randbelow(len(special_positions))]
+        pass_chars[special_pos] = SPECIAL_CHAR_MAP[pass_chars[special_pos]]
+
+
+## Generates XKCD-style password meeting policy by construction, no candidates are discarded
+## Words are drawn uniformly from all sequences meeting length and substitution constraints
+##   by walking precomputed per-policy counts backwards, bounded work per password
+## Required digit/special substitutions are always made, other substitutions as in generate_password
+## Returns dict of {'password': str, 'entropy': exact bits of word selection}, False if policy unsatisfiable
+def generate_constrained_password(min_length=0, max_length=None, require_digit=False, require_special=False, rand=None):
+    rand = rand or RandomBuffer(SINGLE_PASSWORD_BUFFER_SIZE)
+    counts = get_policy_counts(min_length, max_length, require_digit, require_special)
+    if not counts[-1]:
+        return False
+
+    words = load_wordlist()
+    buckets = get_word_index()
+
+    ## Pick final (length, features), then peel off one word at a time from the end
+    total_len, features = weighted_choice(counts[-1], rand)
+    pass_words = []
+    for k in range(NUM_WORDS_IN_PASS, 0, -1):
+        options = {}
+        for (word_len, word_features), word_nums in buckets.items():
+            for prev_features, num_seqs in counts[k-1].get(total_len - word_len, {}).items():
+                if combine_features(prev_features, word_features) == features:
+                    options[(word_len, word_features, prev_features)] = num_seqs * len(word_nums)
+
+        word_len, word_features, features = weighted_choice(options, rand)
+        word_nums = buckets[(word_len, word_features)]
+        pass_words.append(words[word_nums[rand.randbelow(len(word_nums))]])
+        total_len -= word_len
+    pass_words.reverse()
+
+    ## CamelCase words
+    pass_chars = list(''.join([x[0].upper()+x[1:] for x in pass_words]))
+
+    ## Sub random number of letters with special chars / digits, required subs count towards them
+    num_char_swaps = rand.randbelow(MAX_CHAR_SWAPS+1)
+    num_digit_swaps = rand.randbelow(num_char_swaps+1)
+    num_special_swaps = num_char_swaps - num_digit_swaps
+
+    sub_required_chars(pass_chars, require_digit, require_special, rand)
+    num_digit_swaps = max(0, num_digit_swaps - 1) if require_digit else num_digit_swaps
+    num_special_swaps = max(0, num_special_swaps - 1) if require_special else num_special_swaps
+
+    sub_obj = sub_chars(''.join(pass_chars), DIGIT_CHAR_MAP, num_digit_swaps, rand)
+    if sub_obj['subs_made'] < num_digit_swaps:
+        num_special_swaps += num_digit_swaps - sub_obj['subs_made']
+    password = sub_chars(sub_obj['password'], SPECIAL_CHAR_MAP, num_special_swaps, rand)['password']
+
+    return {
+        'password': password,
+        'entropy': get_policy_entropy(min_length, max_length, require_digit, require_special)
+    }
@@ -1,4 +1,3 @@
-import time
 import sys
 
 try:
@@ -10,7 +9,10 @@ except:
     sys.exit()
 
 from console.hacc_console import console
+from state.hacc_state import invalidate_component_state
+from classes.vault import Vault
 from classes.vault_installer import VaultInstaller
+from waiters.hacc_waiters import wait_for_vault_access
 
 from hacc_add import add
 
@@ -19,6 +21,7 @@ from hacc_add import add
 ## Optionally setup SCP for organizational account to lock down Vault access
 def install(args, config):
     console.print('Installing new Vault...')
+    invalidate_component_state()
 
     total_resources_to_create = 3 if config['create_scp'] else 2
     installer = VaultInstaller(config)
@@ -57,8 +60,11 @@ def install(args, config):
 
     ## If import file provided, add credentials to new Vault
     if args.file:
-        console.print('Pausing for 15 seconds for Vault components to become active before importing credentials...')
-        time.sleep(15)
+        console.print('Waiting for Vault components to become active before importing credentials...')
+        if not wait_for_vault_access(Vault(config), config['aws_hacc_kms_alias']):
+            console.print('[red]Timed out waiting for Vault components to become active')
+            console.print('Retry the import once the Vault is active')
+            return
 
         add(args, config)
         console.print('Credentials successfully imported into new Vault.')
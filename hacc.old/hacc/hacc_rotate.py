@@ -1,14 +1,36 @@
-import time
+import sys
 
-from console.hacc_console import console
+try:
+    from rich.panel import Panel
+    from rich.padding import Padding
+except:
+    print('Python module "rich" required for HACC. Install (pip install rich) and try again')
+    sys.exit()
 
-from hacc_add import add
-from hacc_delete import delete
+from console.hacc_console import console
+from classes.hacc_service import HaccService
 
 
+## Rotate password in place, service is read once and written with one overwriting put
+## Credential is never missing from Vault during rotation
 def rotate(args, config):
-    delete(args, config)
-    console.print('Sleeping for 3 seconds to fully delete before updating...')
-    time.sleep(3)
-    add(args, config)
+    console.print('Rotating credential...')
+    service_name = args.service
+    user = args.username
+
+    svc_obj = HaccService(service_name, config=config)
+    if not svc_obj.update_credential(user, args.password):
+        console.print(f'Username [yellow]{user} [white]does not exist for service [steel_blue3]{service_name}, [white]exiting.')
+        return
+
+    if not svc_obj.push_to_vault():
+        console.print(f'[red]Failed to rotate password for [yellow]{user} [red]in [steel_blue3]{service_name}.')
+        return
+
+    panel = Panel(
+        f'Rotated password for [yellow]{user} [white]in [steel_blue3]{service_name}.',
+        title='[green]Success',
+        expand=False,
+    )
+    console.print(Padding(panel, (1,0,0,0)))
     return
@@ -0,0 +1,117 @@
+import os
+import sys
+import mmap
+import struct
+
+from logger.hacc_logger import logger
+
+## Packed wordlist format, built from wordlist.py with: python3 hacc_wordlist.py
+##   header | offsets | blob
+## Header is magic + word count, offsets are count+1 uint32 positions into the utf-8 blob,
+##   word i is blob[offsets[i]:offsets[i+1]] so any word is found in O(1) without decoding the rest
+## File is memory-mapped on first use, wordlist.py is only imported if packed file is unusable
+## pyinstaller builds bundle it with --add-data and unpack it under sys._MEIPASS
+if getattr(sys, 'frozen', False):
+    WORDLIST_DIR = getattr(sys, '_MEIPASS', os.path.dirname(sys.executable))
+else:
+    WORDLIST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKED_WORDLIST_FILE = os.path.join(WORDLIST_DIR, 'wordlist.hpw')
+PACKED_MAGIC = b'HPW\x01'
+HEADER_FORMAT = '>4sI'
+HEADER_LEN = struct.calcsize(HEADER_FORMAT)
+OFFSET_FORMAT = '>I'
+OFFSET_LEN = struct.calcsize(OFFSET_FORMAT)
+
+loaded_wordlist = None
+
+
+## PackedWordlist Object:
+##      Read-only sequence of words backed by memory-mapped packed wordlist file
+##
+## Attributes:
+##      num_words, int
+##      blob_start, int offset of word blob in file
+##
+## Methods:
+##      __len__
+##      __getitem__
+##      __iter__
+##
+class PackedWordlist:
+
+    def __len__(self):
+        return self.num_words
+
+
+    ## Returns word at index, decoded straight from its offsets
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.num_words
+        if index < 0 or index >= self.num_words:
+            raise IndexError('wordlist index out of range')
+
+        start, end = struct.unpack_from('>2I', self.mm, HEADER_LEN + index*OFFSET_LEN)
+        return self.mm[self.blob_start+start:self.blob_start+end].decode()
+
+
+    def __iter__(self):
+        for index in range(self.num_words):
+            yield self[index]
+
+
+    ## Raises ValueError if file is not a valid packed wordlist
+    def __init__(self, filename=PACKED_WORDLIST_FILE):
+        with open(filename, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.mm) < HEADER_LEN:
+            raise ValueError(f'{filename} is not a packed wordlist')
+        magic, self.num_words = struct.unpack_from(HEADER_FORMAT, self.mm)
+        if magic != PACKED_MAGIC or not self.num_words:
+            raise ValueError(f'{filename} is not a packed wordlist')
+
+        self.blob_start = HEADER_LEN + (self.num_words+1)*OFFSET_LEN
+        blob_len = struct.unpack_from(OFFSET_FORMAT, self.mm, self.blob_start - OFFSET_LEN)[0]
+        if self.blob_start + blob_len != len(self.mm):
+            raise ValueError(f'{filename} is truncated')
+
+
+
+## Returns wordlist sequence supporting len() and indexing, loaded once per process
+## Uses packed wordlist if available, otherwise falls back to wordlist.py
+def load_wordlist():
+    global loaded_wordlist
+    if loaded_wordlist != None:
+        return loaded_wordlist
+
+    try:
+        loaded_wordlist = PackedWordlist()
+        logger.debug(f'Loaded {len(loaded_wordlist)} words from packed wordlist')
+    except (OSError, ValueError) as e:
+        logger.debug(f'Packed wordlist unavailable, using wordlist.py: {e}')
+        import wordlist
+        loaded_wordlist = wordlist.wordlist
+    return loaded_wordlist
+
+
+## Writes list of words to packed wordlist file
+def pack_wordlist(words, filename=PACKED_WORDLIST_FILE):
+    encoded_words = [w.encode() for w in words]
+
+    offsets = [0]
+    for w in encoded_words:
+        offsets.append(offsets[-1] + len(w))
+
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, PACKED_MAGIC, len(encoded_words)))
+        f.write(struct.pack(f'>{len(offsets)}I', *offsets))
+        f.write(b''.join(encoded_words))
+    os.replace(tmp_file, filename)
+
+
+## Rebuild packed wordlist after editing wordlist.py
+if __name__ == '__main__':
+    import wordlist
+    pack_wordlist(wordlist.wordlist)
+    print(f'Packed {len(wordlist.wordlist)} words into {PACKED_WORDLIST_FILE}')
@@ -1,14 +1,10 @@
 import argparse
 import re
-import time
 
 from logger.hacc_logger import logger
 from console.hacc_console import console
-from classes.vault import Vault
-from classes.hacc_service import HaccService
 
 from input.hacc_interactive import get_input_with_choices, get_password_for_credential, get_input_string_for_subarg
-from hacc_generate import generate_password
 
 
 ALLOWED_FLAGS = {
@@ -100,6 +96,18 @@ ALLOWED_FLAGS = {
             'name':   'show',
             'help':   'Show client configuration parameter',
             'type':   'string'
+        },
+        {
+            's_flag': None,
+            'name':   'dryrun',
+            'help':   'Show import plan without making changes to Vault, used with add --file',
+            'type':   'bool'
+        },
+        {
+            's_flag': None,
+            'name':   'incremental',
+            'help':   'Previous .ndjson backup file, only back up services changed since',
+            'type':   'string'
         }
     ]
 }
@@ -107,11 +115,11 @@ ALLOWED_FLAGS = {
 ACTION_ALLOWED_SUBARGS = {
     'install':   ['debug', 'file'],
     'eradicate': ['debug', 'wipe'],
-    'add':       ['debug', 'service', 'username', 'password', 'generate', 'file'],
+    'add':       ['debug', 'service', 'username', 'password', 'generate', 'file', 'dryrun'],
     'delete':    ['debug', 'service', 'username'],
     'rotate':    ['debug', 'service', 'username', 'password', 'generate'],
     'search':    ['debug', 'service', 'username'],
-    'backup':    ['debug', 'file'],
+    'backup':    ['debug', 'file', 'incremental'],
     'configure': ['debug', 'export', 'set', 'show', 'file', 'password'],
     'upgrade':   ['debug']
 }
@@ -120,8 +128,7 @@ ACTION_INCOMPATABLE_SUBARGS = {
     'add': [
         ['password', 'generate'], 
         ['username', 'file'],
-        ['password', 'file'],
-        ['service', 'file']
+        ['password', 'file']
     ],
     'rotate': [
         ['password', 'generate']
@@ -168,6 +175,9 @@ ALLOWED_ARG_INPUT_COMBOS = [
     #['add', 'password'],
     #['add', 'generate'],
     ['add', 'file'],
+    ['add', 'service', 'file'],
+    ['add', 'file', 'dryrun'],
+    ['add', 'service', 'file', 'dryrun'],
     #['add', 'service', 'username'],
     #['add', 'service', 'password'],
     #['add', 'service', 'generate'],
@@ -201,6 +211,7 @@ ALLOWED_ARG_INPUT_COMBOS = [
 
     #['backup'],
     ['backup', 'file'],
+    ['backup', 'file', 'incremental'],
 
     ['configure', 'show'],
     ['configure', 'set'],
@@ -219,6 +230,9 @@ HACC_SAMPLE_USAGE = [
     '  hacc testService',
     '  hacc --rotate test -u test@yahoo.com -g',
     '  hacc --backup -f test_backup.txt',
+    '  hacc --backup -f nightly_2.ndjson --incremental nightly_1.ndjson',
+    '  hacc --add -f test_backup.hacz testService',
+    '  hacc --add -f test_backup.ndjson --dryrun',
     '  hacc -d testService -u example',
     '  hacc --eradicate --wipe'
 ]
@@ -353,13 +367,11 @@ def eval_args(progress, args):
     if not allowed_subargs(args):
         return False
     progress.update(allowed_task, advance=1)
-    time.sleep(1)
 
     compatible_task = progress.add_task("[steel_blue3]Confirming flags are compatible for action...", total=1)
     if not compatable_subargs(args):
         return False
     progress.update(compatible_task, advance=1)
-    time.sleep(1)
 
     return True
 
@@ -419,6 +431,8 @@ def get_service_name_from_input(svc_input, vault):
 ## Input can either match username exactly, or be a prefix
 ## Returns complete username, False if no matches in Vault
 def get_service_user_from_input(service, user_input, vault):
+    from classes.hacc_service import HaccService
+
     svc_obj = HaccService(service, vault=vault)
 
     ## Check if exact username provided
@@ -459,6 +473,10 @@ def missing_args_for_action(args):
     action = args.action
     missing_args = []
 
+    ## Importing credentials from a file needs no other args, service optionally restricts import
+    if action == 'add' and args.file:
+        return missing_args
+
     for req_subarg in ACTION_REQUIRED_SUBARGS[action]:
         if not getattr(args, req_subarg):
             missing_args.append(req_subarg)
@@ -475,6 +493,9 @@ def validate_args_for_action(args, config):
 
     ## Validate service and username input where possible
     if action == 'search' or action == 'delete':
+        ## AWS client only loaded for actions that touch the Vault
+        from classes.vault import Vault
+
         vault = Vault(config)
         if len(vault.get_all_services()) == 0:
             console.print('Vault is currently empty, add a service credential with [salmon1]hacc --add')
@@ -492,21 +513,13 @@ def validate_args_for_action(args, config):
 
         logger.debug('Successfully validated service and username input')
 
-    ## If importing credentials from a file, provide temp args
-    ##      to meet arg requirements for add action
-    if action == 'add' and args.file:
-        args.username = 'file'
-        args.password = 'file'
-        args.service = 'file'
-
-
     ## Gather any other missing args that can't be validated, if needed
     subargs_to_get = missing_args_for_action(args)
     for subarg in subargs_to_get:
 
         ## Check if we should generate password
         if subarg == 'password':
-            args.password = get_password_for_credential(args.generate)
+            args.password = get_password_for_credential(args.generate, config)
             continue
         else:
             subarg_val = get_input_string_for_subarg(subarg, action)
@@ -11,7 +11,6 @@ except:
     sys.exit()
 
 from console.hacc_console import console, NUM_CHOICES_PER_TABLE
-from hacc_generate import generate_password
 
 
 ## Gets user input from paginated numbered list of acceptable choices
@@ -56,8 +55,10 @@ def get_input_with_choices(choices, choice_type, service=None):
 
 ## If user_requested_generate, generate password and return it
 ## If user did not specify, ask and then either return generated password or user input
+## Password policy from config (length, required digit/special) is met by construction,
+##   so regenerating only changes the proposal, never has to discard one
 ## Returns False if cannot gather password input
-def get_password_for_credential(user_requested_generate):
+def get_password_for_credential(user_requested_generate, config=None):
     gen_password = True
     credential_password = None
 
@@ -65,10 +66,22 @@ def get_password_for_credential(user_requested_generate):
         gen_password = False if Prompt.ask('Would you like to generate a [green]password?', default='y').lower() != 'y' else True
 
     if gen_password:
-        need_passwd = True
-        while need_passwd:
-            proposed_password = generate_password()
-            console.print(Panel(f'[steel_blue3]Generated password: [purple]{proposed_password}', expand=False))
+        ## Wordlist only loaded when a password is generated
+        from hacc_generate import generate_password, generate_constrained_password, get_password_policy
+
+        policy = get_password_policy(config or {})
+        while True:
+            if policy:
+                generated = generate_constrained_password(**policy)
+                if not generated:
+                    console.print('[red]No generated password can meet the password policy in configuration, [white]check password_min_length/password_max_length')
+                    return False
+                proposed_password = generated['password']
+                console.print(Panel(f'[steel_blue3]Generated password: [purple]{proposed_password} [white]({generated["entropy"]:.0f} bits)', expand=False))
+            else:
+                proposed_password = generate_password()
+                console.print(Panel(f'[steel_blue3]Generated password: [purple]{proposed_password}', expand=False))
+
             if Prompt.ask('Use this [green]password?', default='y').lower() == 'y':
                 credential_password = proposed_password
                 break
@@ -0,0 +1,107 @@
+import os
+import json
+import time
+
+from logger.hacc_logger import logger
+
+## Local cache of last healthy Vault component check, saved next to hacc.conf:
+##   {"checked_at": 1700000000, "key": {...config values...},
+##    "components": {"aws_account_id": "...", "cmk": "arn:...", "user": "arn:...", "scp": "p-..."}}
+## Lets data actions skip the management API calls, removed on install/eradicate
+STATE_FILENAME = 'hacc.state'
+DEFAULT_COMPONENT_CACHE_TTL = 3600 ## seconds
+COMPONENT_STATE_KEYS = [
+    'aws_hacc_region',
+    'aws_hacc_uname',
+    'aws_hacc_kms_alias',
+    'aws_hacc_param_path',
+    'create_scp',
+    'aws_hacc_scp'
+]
+
+
+## Returns path of local state file in HACC config directory, None if home directory unknown
+## Optional filename for other local caches
+def get_state_file_location(filename=STATE_FILENAME):
+    ## check for windows system
+    if 'USERPROFILE' in os.environ:
+        return os.path.join(os.environ['USERPROFILE'], '.hacc', filename)
+    ## check for linux/mac
+    if 'HOME' in os.environ:
+        return os.path.join(os.environ['HOME'], '.hacc', filename)
+    return None
+
+
+## Returns component cache TTL in seconds from config, 0 disables the cache
+def get_component_cache_ttl(config):
+    try:
+        return max(0, int(config.get('component_cache_ttl', DEFAULT_COMPONENT_CACHE_TTL)))
+    except (TypeError, ValueError):
+        return DEFAULT_COMPONENT_CACHE_TTL
+
+
+## Config values the cached components depend on, a change to any of them invalidates the cache
+def get_component_state_key(config):
+    return {k: config.get(k) for k in COMPONENT_STATE_KEYS}
+
+
+## Returns cached components dict if state file is fresh and matches config
+## Returns None if cache missing, expired, disabled or written for a different config
+def read_component_state(config):
+    ttl = get_component_cache_ttl(config)
+    state_file = get_state_file_location()
+    if not ttl or not state_file:
+        return None
+
+    try:
+        with open(state_file, 'r') as f:
+            state = json.loads(f.read())
+        checked_at = float(state['checked_at'])
+        components = state['components']
+    except FileNotFoundError:
+        return None
+    except:
+        logger.debug(f'Ignoring unreadable state file {state_file}')
+        return None
+
+    if state.get('key') != get_component_state_key(config):
+        logger.debug('Cached Vault components were checked for a different configuration')
+        return None
+
+    age = time.time() - checked_at
+    if age < 0 or age > ttl:
+        logger.debug(f'Cached Vault components expired ({int(age)}s old, ttl {ttl}s)')
+        return None
+
+    logger.debug(f'Using cached Vault components checked {int(age)}s ago')
+    return components
+
+
+## Atomically saves healthy component check result to state file
+## Returns False if state could not be saved
+def write_component_state(config, components):
+    state_file = get_state_file_location()
+    if not get_component_cache_ttl(config) or not state_file:
+        return False
+
+    tmp_file = state_file + '.tmp'
+    try:
+        with open(tmp_file, 'w') as f:
+            f.write(json.dumps({
+                'checked_at': time.time(),
+                'key': get_component_state_key(config),
+                'components': components
+            }))
+        os.replace(tmp_file, state_file)
+    except OSError as e:
+        logger.debug(f'Unable to save Vault component state: {e}')
+        return False
+    return True
+
+
+## Removes cached component state, next data action re-checks Vault components
+def invalidate_component_state():
+    state_file = get_state_file_location()
+    if state_file and os.path.exists(state_file):
+        logger.debug('Removing cached Vault component state')
+        os.remove(state_file)
@@ -6,11 +6,12 @@ from console.hacc_console import console
 
 
 ## Function that builds Windows HACC executable using pyinstaller
+## Packed wordlist is data, not an import, so it must be added to the bundle explicitly
 ## Returns absolute path of executable if successful build, None otherwise
 def build_executable(source_dir):
     cwd = os.getcwd()
     os.chdir(source_dir)
-    build_res = subprocess.run(['pyinstaller', 'hacc'],
+    build_res = subprocess.run(['pyinstaller', '--add-data', f'wordlist.hpw{os.pathsep}.', 'hacc'],
                                 stdout=subprocess.DEVNULL).returncode
     os.chdir(cwd)
     if build_res != 0:
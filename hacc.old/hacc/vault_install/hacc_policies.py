@@ -7,6 +7,7 @@ VAULT_IAM_PERMS = """
             "Action": [
                 "ssm:DescribeParameters",
                 "ssm:GetParameter",
+                "ssm:GetParameters",
                 "ssm:GetParametersByPath",
                 "ssm:DeleteParameter*",
                 "ssm:PutParameter"
@@ -1,7 +1,10 @@
 import sys
 import os
+import json
+import time
 import requests
 import shutil
+import threading
 
 try:
     from packaging import version
@@ -10,7 +13,16 @@ except:
     sys.exit()
 
 from console.hacc_console import console
+from logger.hacc_logger import logger
+from state.hacc_state import get_state_file_location
 
+HACC_TAGS_URL = 'https://api.github.com/repos/nbailey20/HACC/tags'
+TAGS_CACHE_FILENAME = 'hacc_tags.cache'
+TAGS_CACHE_TTL = 6 * 60 * 60 ## seconds before cached tag list is refreshed
+TAGS_REQUEST_TIMEOUT = 5
+
+## Background upgrade check started this run, kept out of config so it is never exported
+upgrade_check = {'thread': None, 'known_version': None}
 
 
 ## Function that takes in a list of Hacc versions + current version and returns either:
@@ -82,17 +94,102 @@ def check_for_old_versions(current_version):
     return old_versions
 
 
+## Returns cached tag list dict of form {'checked_at': time, 'etag': str, 'versions': [...]}
+## Returns None if no readable cache
+def read_tags_cache():
+    cache_file = get_state_file_location(TAGS_CACHE_FILENAME)
+    try:
+        with open(cache_file, 'r') as f:
+            cache = json.loads(f.read())
+        return {'checked_at': float(cache['checked_at']), 'etag': cache.get('etag'), 'versions': cache['versions']}
+    except:
+        return None
+
+
+## Atomically saves tag list cache, failure only means the next run checks again
+def write_tags_cache(cache):
+    cache_file = get_state_file_location(TAGS_CACHE_FILENAME)
+    if not cache_file:
+        return
+    tmp_file = cache_file + '.tmp'
+    try:
+        with open(tmp_file, 'w') as f:
+            f.write(json.dumps(cache))
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.debug(f'Unable to save HACC tag cache: {e}')
+
+
+## Returns True if cached tag list is missing or older than TTL
+def tags_cache_stale(cache):
+    return not cache or time.time() - cache['checked_at'] > TAGS_CACHE_TTL
+
+
+## Refreshes cached tag list from github with conditional request
+## Unchanged tags (304 Not Modified) only refresh the cache timestamp
+## Returns list of all HACC versions, None if request failed
+def refresh_tags_cache(cache=None):
+    headers = {}
+    if cache and cache['etag']:
+        headers['If-None-Match'] = cache['etag']
+
+    try:
+        res = requests.get(HACC_TAGS_URL, headers=headers, timeout=TAGS_REQUEST_TIMEOUT)
+        if res.status_code == 304 and cache:
+            logger.debug('HACC tags unchanged since last check')
+            all_versions = cache['versions']
+        else:
+            res.raise_for_status()
+            all_versions = [tag['name'] for tag in res.json()]
+    except Exception as e:
+        logger.debug(f'Error refreshing HACC tags: {e}')
+        return None
+
+    write_tags_cache({'checked_at': time.time(), 'etag': res.headers.get('ETag'), 'versions': all_versions})
+    return all_versions
+
+
 ## Function to check github for newer versions of HACC
 ## Returns newer version if it exists, None otherwise
 def check_for_upgrades(current_version):
-    try:
-        all_version_data = requests.get('https://api.github.com/repos/nbailey20/HACC/tags').json()
-        all_versions = [tag['name'] for tag in all_version_data]
-    except Exception as e:
-        console.print(f'[red]Error checking for potential upgrades: {e}')
+    all_versions = refresh_tags_cache(read_tags_cache())
+    if all_versions == None:
+        console.print('[red]Error checking for potential upgrades')
         return None
 
     newer_version = compare_hacc_versions(all_versions, current_version)
     if newer_version:
         return newer_version
     return None
+
+
+## Non-blocking upgrade check, answers from cached tag list straight away
+## If cache is stale a daemon thread refreshes it, see finish_upgrade_check
+## Returns newer version from cache, None if none known yet
+def start_upgrade_check(current_version):
+    cache = read_tags_cache()
+    newer_version = compare_hacc_versions(cache['versions'], current_version) if cache else None
+    upgrade_check['known_version'] = newer_version or None
+
+    if tags_cache_stale(cache):
+        upgrade_check['thread'] = threading.Thread(target=refresh_tags_cache, args=(cache,), daemon=True)
+        upgrade_check['thread'].start()
+
+    return newer_version or None
+
+
+## Returns newer version found by background refresh if it finished and found something new
+## A refresh still in flight is abandoned, its result is shown on the next run
+def finish_upgrade_check(current_version):
+    refresh_thread = upgrade_check['thread']
+    if not refresh_thread or refresh_thread.is_alive():
+        return None
+
+    cache = read_tags_cache()
+    if not cache:
+        return None
+
+    newer_version = compare_hacc_versions(cache['versions'], current_version)
+    if newer_version and newer_version != upgrade_check['known_version']:
+        return newer_version
+    return None
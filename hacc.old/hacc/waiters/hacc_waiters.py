@@ -0,0 +1,66 @@
+import time
+
+from logger.hacc_logger import logger
+
+## Readiness waiters, poll the actual condition instead of sleeping a fixed time
+## Delay between polls doubles from INITIAL_DELAY up to MAX_DELAY until deadline passes
+INITIAL_DELAY = 0.5
+MAX_DELAY = 8
+BACKOFF_FACTOR = 2
+
+VAULT_ACCESS_TIMEOUT = 120 ## New IAM access keys can take a minute or two to propagate
+VAULT_EMPTY_TIMEOUT = 60
+SCP_DETACH_TIMEOUT = 60
+
+
+## Polls condition function with exponential backoff until it returns truthy value
+## Returns True once condition met, False if timeout (seconds) expires first
+def wait_until(condition, description, timeout, initial_delay=INITIAL_DELAY, max_delay=MAX_DELAY):
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    attempt = 1
+
+    while True:
+        if condition():
+            logger.debug(f'{description} after {attempt} checks')
+            return True
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.debug(f'Timed out after {timeout}s waiting until {description}')
+            return False
+
+        logger.debug(f'Waiting {delay:.1f}s until {description}')
+        time.sleep(min(delay, remaining))
+        delay = min(delay * BACKOFF_FACTOR, max_delay)
+        attempt += 1
+
+
+## Waits until Vault IAM user credentials can use the Vault key and parameter path
+## Returns True if Vault usable, False if timed out
+def wait_for_vault_access(vault, kms_alias, timeout=VAULT_ACCESS_TIMEOUT):
+    def vault_accessible():
+        kms_arn = vault.get_kms_arn(kms_alias)
+        if not kms_arn:
+            return False
+        vault.kms_arn = kms_arn
+
+        return bool(vault.aws_client.call(
+            'ssm', 'get_parameters_by_path',
+            Path = '/'+vault.param_path,
+            MaxResults = 1
+        ))
+
+    return wait_until(vault_accessible, 'Vault credentials active', timeout)
+
+
+## Waits until Vault listing returns no services
+## Returns True if Vault empty, False if timed out
+def wait_for_vault_empty(vault, timeout=VAULT_EMPTY_TIMEOUT):
+    return wait_until(lambda: vault.get_all_services() == [], 'Vault empty', timeout)
+
+
+## Waits until scp_attached function reports SCP is no longer attached
+## Returns True if detached, False if timed out
+def wait_for_scp_detached(scp_attached, policy_id, timeout=SCP_DETACH_TIMEOUT):
+    return wait_until(lambda: scp_attached(policy_id) == False, f'SCP {policy_id} detached', timeout)